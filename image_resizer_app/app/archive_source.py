@@ -0,0 +1,105 @@
+import io
+import os
+import queue
+import tarfile
+import zipfile
+import threading
+from PIL import Image
+
+ARCHIVE_EXTENSIONS = (".zip", ".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tar.xz")
+MEMBER_EXTENSIONS = (".jpg", ".jpeg", ".png", ".tif", ".tiff", ".gif", ".webp", ".bmp")
+# upcoming members read ahead while the current one is sliced; memory stays at a few images
+PREFETCH = 2
+
+
+def is_archive(path):
+    return str(path).lower().endswith(ARCHIVE_EXTENSIONS)
+
+
+def member_path(name):
+    # archive paths become relative output folders; absolute paths and ".." never escape the output root
+    parts = [p for p in name.replace("\\", "/").split("/") if p not in ("", ".", "..")]
+    return os.path.join(*parts) if parts else "member"
+
+
+def member_names(path):
+    # image members in archive order, for callers that open them one at a time with open_member
+    if path.lower().endswith(".zip"):
+        with zipfile.ZipFile(path) as archive:
+            return [info.filename for info in archive.infolist()
+                    if not info.is_dir() and info.filename.lower().endswith(MEMBER_EXTENSIONS)]
+    with tarfile.open(path) as archive:
+        return [info.name for info in archive.getmembers()
+                if info.isfile() and info.name.lower().endswith(MEMBER_EXTENSIONS)]
+
+
+def open_member(path, name):
+    if path.lower().endswith(".zip"):
+        with zipfile.ZipFile(path) as archive:
+            data = archive.read(name)
+    else:
+        with tarfile.open(path) as archive:
+            data = archive.extractfile(name).read()
+    image = Image.open(io.BytesIO(data))
+    image.load()
+    return image
+
+
+def read_members(path):
+    # members in archive order as (name, bytes); tar is read as a forward-only stream
+    if path.lower().endswith(".zip"):
+        with zipfile.ZipFile(path) as archive:
+            for info in archive.infolist():
+                if not info.is_dir() and info.filename.lower().endswith(MEMBER_EXTENSIONS):
+                    with archive.open(info) as member:
+                        yield info.filename, member.read()
+    else:
+        with tarfile.open(path, "r|*") as archive:
+            for info in archive:
+                if info.isfile() and info.name.lower().endswith(MEMBER_EXTENSIONS):
+                    yield info.name, archive.extractfile(info).read()
+
+
+def prefetch(iterable, depth=PREFETCH):
+    # a reader thread stays at most `depth` items ahead of the consumer
+    items = queue.Queue(maxsize=depth)
+    done = object()
+    stop = threading.Event()
+
+    def run():
+        try:
+            for item in iterable:
+                if stop.is_set():
+                    return
+                items.put(item)
+            items.put(done)
+        except BaseException as e:
+            items.put(e)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = items.get()
+            if item is done:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        # unblock a reader waiting on a full queue so it can see the stop flag
+        while thread.is_alive():
+            try:
+                items.get_nowait()
+            except queue.Empty:
+                thread.join(0.01)
+
+
+def iter_archive_images(path, depth=PREFETCH):
+    # (member name, decoded image); each image is decoded from the member's bytes and dropped by
+    # the caller before the next one, so memory does not grow with the archive
+    for name, data in prefetch(read_members(path), depth):
+        image = Image.open(io.BytesIO(data))
+        image.load()
+        yield name, image
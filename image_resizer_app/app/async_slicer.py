@@ -0,0 +1,64 @@
+import io
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image
+from app.export_crops import plan_crops, prepare_crop, resize_crop
+from app.export_journal import encode_image
+
+DEFAULT_CONCURRENCY = 4
+
+
+def open_source(source):
+    image = Image.open(io.BytesIO(source) if isinstance(source, (bytes, bytearray, memoryview)) else source)
+    image.load()
+    return image
+
+
+def encode_crop(image, box, ext, resize_percent):
+    # runs in the executor; box is None when the crop was already cut for a process pool
+    crop = image if box is None else image.crop(box)
+    return encode_image(prepare_crop(resize_crop(crop, resize_percent), ext), "crop" + ext)
+
+
+async def slice_image(source, vertical_lines=(), horizontal_lines=(), boxes=None, includes=None, ext=".png",
+                      resize_percent=None, executor=None, concurrency=DEFAULT_CONCURRENCY):
+    # yields (index, box, encoded bytes) in completion order; closing the generator or cancelling
+    # the consuming task cancels every crop that has not started yet
+    loop = asyncio.get_running_loop()
+    # a process pool would pickle the whole image per task, so it only ever receives cut tiles;
+    # decoding and cutting run on the loop's default thread pool, never on the loop itself
+    in_process = isinstance(executor, ProcessPoolExecutor)
+    image = await loop.run_in_executor(None if in_process else executor, open_source, source)
+    boxes, includes = plan_crops(image.size, list(vertical_lines), list(horizontal_lines), boxes, includes)
+    todo = [(i, box) for i, (box, flag) in enumerate(zip(boxes, includes)) if flag]
+
+    async def crop_in_process(box):
+        tile = await loop.run_in_executor(None, image.crop, box)
+        return await loop.run_in_executor(executor, encode_crop, tile, None, ext, resize_percent)
+
+    def submit(index, box):
+        if in_process:
+            future = asyncio.ensure_future(crop_in_process(box))
+        else:
+            future = loop.run_in_executor(executor, encode_crop, image, box, ext, resize_percent)
+        running[future] = (index, box)
+
+    running = {}
+    queue = iter(todo)
+    try:
+        for index, box in queue:
+            submit(index, box)
+            if len(running) >= concurrency:
+                break
+        while running:
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                index, box = running.pop(future)
+                yield index, box, future.result()
+                next_crop = next(queue, None)
+                if next_crop:
+                    submit(*next_crop)
+    finally:
+        for future in running:
+            future.cancel()
+        image.close()
@@ -0,0 +1,49 @@
+import math
+import numpy as np
+from PIL import Image
+
+ANALYSIS_SIDE = 2048
+DEFAULT_TOLERANCE = 12
+# share of a row/column that may differ from the background and still count as gutter
+INK_RATIO = 0.002
+
+
+def analysis_array(image, analysis_side=ANALYSIS_SIDE):
+    factor = max(1, math.ceil(max(image.size) / analysis_side))
+    small = image
+    if factor > 1:
+        # strided subsample; gutters at least `factor` px wide survive intact and it is far cheaper than reduce()
+        small = image.resize((image.width // factor, image.height // factor), Image.Resampling.NEAREST)
+    if "A" in small.getbands():
+        alpha = np.asarray(small.getchannel("A"), dtype=np.int16)
+        # transparent pixels are background, anything visible is content; a fully opaque alpha
+        # band (screenshots, Qt's RGBA decode) carries no layout and falls through to colour
+        if alpha.size and alpha.min() < 255:
+            return alpha, 0
+    gray = np.asarray(small.convert("L"), dtype=np.int16)
+    border = np.concatenate([gray[0], gray[-1], gray[:, 0], gray[:, -1]])
+    return gray, int(np.median(border))
+
+
+def band_centers(blank):
+    # centers of runs of blank rows/columns that do not touch the image edges
+    padded = np.concatenate(([False], blank, [False])).astype(np.int8)
+    edges = np.diff(padded)
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    interior = (starts > 0) & (ends < len(blank))
+    return (starts[interior] + ends[interior]) / 2.0
+
+
+def detect_guides(image, tolerance=DEFAULT_TOLERANCE, analysis_side=ANALYSIS_SIDE):
+    values, background = analysis_array(image, analysis_side)
+    ink = np.abs(values - background) > tolerance
+    blank_cols = ink.mean(axis=0) <= INK_RATIO
+    blank_rows = ink.mean(axis=1) <= INK_RATIO
+
+    width, height = image.size
+    x_scale = width / values.shape[1]
+    y_scale = height / values.shape[0]
+    vertical = [int(round(c * x_scale)) for c in band_centers(blank_cols)]
+    horizontal = [int(round(c * y_scale)) for c in band_centers(blank_rows)]
+    return vertical, horizontal
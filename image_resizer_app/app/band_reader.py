@@ -0,0 +1,87 @@
+from PIL import Image
+
+
+def row_bytes(mode, rawmode, width):
+    try:
+        return len(Image.new(mode, (width, 1)).tobytes("raw", rawmode))
+    except Exception:
+        return None
+
+
+def raw_strips(image):
+    # (x0, y0, x1, y1, offset, rawmode, stride, orientation) per strip/tile, or None if
+    # any tile needs a real decoder and the rows cannot be addressed directly
+    strips = []
+    for codec_name, extents, offset, args in image.tile:
+        if codec_name != "raw":
+            return None
+        if not isinstance(args, tuple):
+            args = (args,)
+        rawmode = args[0]
+        stride = args[1] if len(args) > 1 else 0
+        orientation = args[2] if len(args) > 2 else 1
+        x0, y0, x1, y1 = extents
+        if not stride:
+            stride = row_bytes(image.mode, rawmode, x1 - x0)
+            if stride is None:
+                return None
+        strips.append((x0, y0, x1, y1, offset, rawmode, stride, orientation))
+    return strips or None
+
+
+class BandReader:
+    def __init__(self, path):
+        self.path = path
+        # streamed sources may exceed Pillow's decompression bomb limit, and only the header is read
+        # here; sources that still need a full decode meet the limit again in read()
+        limit = Image.MAX_IMAGE_PIXELS
+        Image.MAX_IMAGE_PIXELS = None
+        try:
+            with Image.open(path) as image:
+                self.mode = image.mode
+                self.size = image.size
+                self.strips = raw_strips(image)
+                # palette images (8-bit BMP, palette TIFF) store indices; bands need the palette back
+                self.palette = image.palette.copy() if image.palette else None
+                self.transparency = image.info.get("transparency")
+        finally:
+            Image.MAX_IMAGE_PIXELS = limit
+        self.image = None
+
+    @property
+    def streaming(self):
+        return self.strips is not None
+
+    def read(self, y0, y1):
+        # returns an image holding at least rows y0..y1 and the row offset of its top edge
+        if not self.streaming:
+            if self.image is None:
+                self.image = Image.open(self.path)
+                self.image.load()
+            return self.image, 0
+
+        band = Image.new(self.mode, (self.size[0], y1 - y0))
+        with open(self.path, "rb") as f:
+            for x0, sy0, x1, sy1, offset, rawmode, stride, orientation in self.strips:
+                a, b = max(y0, sy0), min(y1, sy1)
+                if a >= b:
+                    continue
+                if orientation < 0:
+                    # bottom-up rows: row y is stored at (sy1 - 1 - y) * stride
+                    f.seek(offset + (sy1 - b) * stride)
+                else:
+                    f.seek(offset + (a - sy0) * stride)
+                size = (b - a) * stride
+                data = f.read(size).ljust(size, b"\0")
+                rows = Image.frombytes(self.mode, (x1 - x0, b - a), data, "raw", rawmode, stride, orientation)
+                band.paste(rows, (x0, a - y0))
+        if self.palette is not None:
+            band.palette = self.palette.copy()
+        if self.transparency is not None:
+            band.info["transparency"] = self.transparency
+        return band, y0
+
+    def close(self):
+        if self.image is not None:
+            self.image.close()
+            self.image = None
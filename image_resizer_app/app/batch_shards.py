@@ -0,0 +1,338 @@
+import os
+import sys
+import json
+import time
+import uuid
+import socket
+import argparse
+import threading
+from app.archive_source import is_archive, member_names, member_path, open_member
+from app.export_crops import export_crops, input_folders, parse_lines, unique_folder, written_entries
+from app.export_sinks import DirectorySink
+from app.export_journal import atomic_write
+from app.tile_filter import DEDUPE_MODES, TileFilter
+
+BATCH_NAME = "batch.json"
+DEFAULT_SHARD_SIZE = 16
+# workers on different hosts compare lease expiry against their own clocks; keep leases well
+# above any expected clock skew
+DEFAULT_LEASE_SECONDS = 60
+
+
+def read_json(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_json(path, data):
+    encoded = json.dumps(data).encode("utf-8")
+    atomic_write(path, lambda f: f.write(encoded))
+
+
+def shard_name(index):
+    return f"shard-{index:05d}"
+
+
+def create_batch(batch_dir, images, output_dir, shard_size=DEFAULT_SHARD_SIZE, options=None):
+    for folder in ("leases", "done", "progress"):
+        os.makedirs(os.path.join(batch_dir, folder), exist_ok=True)
+    # folders are fixed here so workers never share one, even for equal file names
+    folders = {}
+    # ZIP/tar inputs become one job per image member, "<archive>/<member>", read straight from the archive
+    members = {}
+    for path, folder in input_folders([os.path.abspath(p) for p in images]).items():
+        if not is_archive(path):
+            folders[path] = folder
+            continue
+        used = set()
+        for name in member_names(path):
+            job = f"{path}/{name}"
+            if job not in folders:
+                folders[job] = os.path.join(folder, unique_folder(*os.path.splitext(member_path(name)), used))
+                members[job] = [path, name]
+    images = list(folders)
+    shards = [images[i:i + shard_size] for i in range(0, len(images), shard_size)]
+    write_json(os.path.join(batch_dir, BATCH_NAME), {
+        "output_dir": os.path.abspath(output_dir),
+        "options": options or {},
+        "shards": {shard_name(i): shard for i, shard in enumerate(shards)},
+        "folders": folders,
+        "members": members,
+    })
+    return len(shards)
+
+
+class Lease:
+    # leases/<shard>.<generation>.lease; the highest generation owns the shard. Taking over an
+    # expired lease means creating the next generation with O_EXCL, which only one contender can win
+    def __init__(self, batch_dir, shard, worker, seconds=DEFAULT_LEASE_SECONDS):
+        self.folder = os.path.join(batch_dir, "leases")
+        self.shard = shard
+        self.worker = worker
+        self.seconds = seconds
+        self.generation = None
+        self.expires = 0
+        self.lost = False
+
+    def path(self, generation):
+        return os.path.join(self.folder, f"{self.shard}.{generation}.lease")
+
+    def record(self):
+        self.expires = time.time() + self.seconds
+        return {"worker": self.worker, "host": socket.gethostname(), "pid": os.getpid(), "expires": self.expires}
+
+    def acquire(self):
+        current = latest_generation(self.folder, self.shard)
+        if current is not None and lease_expiry(self.path(current), self.seconds) > time.time():
+            return False
+        generation = 0 if current is None else current + 1
+        try:
+            fd = os.open(self.path(generation), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(self.record(), f)
+            f.flush()
+            os.fsync(f.fileno())
+        self.generation = generation
+        for old in range(generation):
+            if os.path.exists(self.path(old)):
+                os.remove(self.path(old))
+        return True
+
+    def renew(self):
+        info = lease_info(self.path(self.generation))
+        if latest_generation(self.folder, self.shard) != self.generation or (info or {}).get("worker") != self.worker:
+            self.lost = True
+            return False
+        write_json(self.path(self.generation), self.record())
+        return True
+
+    def held(self):
+        # checked before every tile write: a stolen lease, or one the heartbeat let run out, stops
+        # the worker at once instead of after the current image
+        if self.lost:
+            return False
+        if time.time() >= self.expires or latest_generation(self.folder, self.shard) != self.generation:
+            self.lost = True
+        return not self.lost
+
+    def release(self):
+        # the released file stays behind as an already expired tombstone: deleting it would let the next
+        # claimant start over at generation 0, which a stalled holder of the old generation 0 could renew
+        if not self.lost and os.path.exists(self.path(self.generation)):
+            write_json(self.path(self.generation), {"worker": self.worker, "expires": 0, "released": True})
+
+
+def latest_generation(folder, shard):
+    generations = [int(name[len(shard) + 1:-len(".lease")]) for name in os.listdir(folder)
+                   if name.startswith(shard + ".") and name.endswith(".lease")]
+    return max(generations, default=None)
+
+
+def current_lease(batch_dir, shard):
+    folder = os.path.join(batch_dir, "leases")
+    generation = latest_generation(folder, shard)
+    if generation is None:
+        return None
+    return lease_info(os.path.join(folder, f"{shard}.{generation}.lease")) or {"worker": "?", "expires": time.time()}
+
+
+def lease_expiry(path, seconds):
+    info = lease_info(path)
+    if info is not None:
+        return info["expires"]
+    try:
+        # unreadable: either still being written or left empty by a crash right after creation
+        return os.path.getmtime(path) + seconds
+    except FileNotFoundError:
+        return float("inf")
+
+
+def lease_info(path):
+    try:
+        return read_json(path)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+class Heartbeat(threading.Thread):
+    def __init__(self, lease):
+        super().__init__(daemon=True)
+        self.lease = lease
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.lease.seconds / 3):
+            if not self.lease.renew():
+                return
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+class LeaseLost(Exception):
+    pass
+
+
+class LeasedSink(DirectorySink):
+    def __init__(self, output_dir, lease):
+        super().__init__(output_dir)
+        self.lease = lease
+
+    def write(self, name, data):
+        if not self.lease.held():
+            raise LeaseLost(self.lease.shard)
+        super().write(name, data)
+
+
+def export_image(image_path, output_dir, options, lease, folder=None, member=None):
+    tile_filter = None
+    if options.get("skip_blank") or options.get("dedupe"):
+        tile_filter = TileFilter(options.get("skip_blank", False), options.get("dedupe"))
+    # batches created before folders were recorded fall back to the file stem
+    target = os.path.join(output_dir, folder or os.path.splitext(os.path.basename(image_path))[0])
+    image = open_member(*member) if member else None
+    # resume picks up an image a crashed worker left half exported
+    try:
+        with LeasedSink(target, lease) as sink:
+            entries = export_crops(image_path, options.get("vertical", []), options.get("horizontal", []), target,
+                                   options.get("prefix", "cropped"), options.get("suffix", ""),
+                                   options.get("ext", ".jpg"), resize_percent=options.get("resize"), resume=True,
+                                   image=image, tile_filter=tile_filter, sink=sink)
+    finally:
+        if image is not None:
+            image.close()
+    return len(written_entries(entries))
+
+
+def process_shard(batch_dir, batch, shard, lease):
+    images = batch["shards"][shard]
+    progress_path = os.path.join(batch_dir, "progress", shard + ".json")
+    tiles = 0
+    errors = []
+    for done, image_path in enumerate(images):
+        if not lease.held():
+            return False
+        write_json(progress_path, {"worker": lease.worker, "images": done, "total": len(images), "tiles": tiles,
+                                   "errors": errors})
+        try:
+            tiles += export_image(image_path, batch["output_dir"], batch["options"], lease,
+                                  batch.get("folders", {}).get(image_path), batch.get("members", {}).get(image_path))
+        except LeaseLost:
+            return False
+        except Exception as e:
+            # one unreadable input must not stall the shard, or every worker that claims it after us
+            errors.append({"image": image_path, "error": f"{type(e).__name__}: {e}"})
+    write_json(os.path.join(batch_dir, "done", shard + ".json"),
+               {"worker": lease.worker, "images": len(images), "tiles": tiles, "errors": errors,
+                "finished": time.time()})
+    write_json(progress_path, {"worker": lease.worker, "images": len(images), "total": len(images), "tiles": tiles,
+                               "errors": errors})
+    return True
+
+
+def run_worker(batch_dir, worker=None, lease_seconds=DEFAULT_LEASE_SECONDS, log=None):
+    worker = worker or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+    batch = read_json(os.path.join(batch_dir, BATCH_NAME))
+    completed = 0
+    while True:
+        claimed = None
+        for shard in sorted(batch["shards"]):
+            if os.path.exists(os.path.join(batch_dir, "done", shard + ".json")):
+                continue
+            lease = Lease(batch_dir, shard, worker, lease_seconds)
+            if lease.acquire():
+                # another worker may have finished the shard between the check above and the claim
+                if os.path.exists(os.path.join(batch_dir, "done", shard + ".json")):
+                    lease.release()
+                    continue
+                claimed = lease
+                break
+        if claimed is None:
+            return completed
+        heartbeat = Heartbeat(claimed)
+        heartbeat.start()
+        try:
+            finished = process_shard(batch_dir, batch, claimed.shard, claimed)
+        finally:
+            heartbeat.stop()
+            claimed.release()
+        if finished:
+            completed += 1
+            if log:
+                print(f"{worker}: finished {claimed.shard}", file=log)
+
+
+def batch_status(batch_dir):
+    batch = read_json(os.path.join(batch_dir, BATCH_NAME))
+    now = time.time()
+    status = {"shards": len(batch["shards"]), "done": 0, "running": 0, "expired": 0, "pending": 0,
+              "images": sum(len(s) for s in batch["shards"].values()), "images_done": 0, "tiles": 0, "errors": [],
+              "workers": set()}
+    for shard in batch["shards"]:
+        progress = lease_info(os.path.join(batch_dir, "progress", shard + ".json")) or {}
+        status["images_done"] += progress.get("images", 0)
+        status["tiles"] += progress.get("tiles", 0)
+        status["errors"] += progress.get("errors", [])
+        if os.path.exists(os.path.join(batch_dir, "done", shard + ".json")):
+            status["done"] += 1
+            continue
+        lease = current_lease(batch_dir, shard)
+        if lease is None or lease.get("released"):
+            status["pending"] += 1
+        elif lease["expires"] < now:
+            status["expired"] += 1
+        else:
+            status["running"] += 1
+            status["workers"].add(lease["worker"])
+    status["workers"] = sorted(status["workers"])
+    return status
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="batch_shards", description="Slice a large image set with several workers.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    create = sub.add_parser("create", help="split images into shards")
+    create.add_argument("batch")
+    create.add_argument("images", nargs="+")
+    create.add_argument("-o", "--output-dir", required=True)
+    create.add_argument("--shard-size", type=int, default=DEFAULT_SHARD_SIZE)
+    create.add_argument("-x", "--vertical", type=parse_lines, default=[])
+    create.add_argument("-y", "--horizontal", type=parse_lines, default=[])
+    create.add_argument("--prefix", default="cropped")
+    create.add_argument("--suffix", default="")
+    create.add_argument("--ext", default=".jpg")
+    create.add_argument("--resize", type=float, default=None)
+    create.add_argument("--skip-blank", action="store_true")
+    create.add_argument("--dedupe", choices=DEDUPE_MODES, default=None)
+    work = sub.add_parser("work", help="claim and process shards until none are left")
+    work.add_argument("batch")
+    work.add_argument("--worker", help="worker id (defaults to host-pid)")
+    work.add_argument("--lease", type=float, default=DEFAULT_LEASE_SECONDS, help="lease length in seconds")
+    status = sub.add_parser("status", help="aggregate progress over all shards")
+    status.add_argument("batch")
+    args = parser.parse_args(argv)
+
+    if args.command == "create":
+        options = {"vertical": args.vertical, "horizontal": args.horizontal, "prefix": args.prefix,
+                   "suffix": args.suffix, "ext": args.ext, "resize": args.resize,
+                   "skip_blank": args.skip_blank, "dedupe": args.dedupe}
+        count = create_batch(args.batch, args.images, args.output_dir, args.shard_size, options)
+        print(f"Created {count} shards in: {args.batch}")
+    elif args.command == "work":
+        count = run_worker(args.batch, args.worker, args.lease, log=sys.stdout)
+        print(f"Processed {count} shards")
+    else:
+        s = batch_status(args.batch)
+        print(f"shards: {s['done']}/{s['shards']} done, {s['running']} running, {s['expired']} expired, "
+              f"{s['pending']} pending")
+        print(f"images: {s['images_done']}/{s['images']}, tiles written: {s['tiles']}, failed: {len(s['errors'])}")
+        for error in s["errors"]:
+            print(f"FAILED: {error['image']}: {error['error']}")
+        if s["workers"]:
+            print(f"workers: {', '.join(s['workers'])}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+import os
+import sys
+import time
+import signal
+import argparse
+import tempfile
+import subprocess
+import numpy as np
+from PIL import Image
+from app.batch_shards import BATCH_NAME, batch_status, create_batch, lease_info, read_json
+from app.export_verify import verify_export
+
+# the package root, so `python -m app.batch_shards` resolves in the worker processes
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def make_images(folder, count, size):
+    rng = np.random.default_rng(0)
+    paths = []
+    for i in range(count):
+        path = os.path.join(folder, f"input-{i:03d}.png")
+        # noise keeps the PNG encoder busy, so a worker is still mid-shard when it gets killed
+        Image.fromarray(rng.integers(0, 256, (size, size, 3), dtype=np.uint8)).save(path)
+        paths.append(path)
+    return paths
+
+
+def start_worker(batch_dir, worker, lease_seconds):
+    return subprocess.Popen([sys.executable, "-m", "app.batch_shards", "work", batch_dir, "--worker", worker,
+                             "--lease", str(lease_seconds)], cwd=ROOT, stdout=subprocess.DEVNULL)
+
+
+def wait_mid_shard(batch_dir, worker, process, timeout):
+    # the victim is mid-shard once its progress file shows an image started but not the whole shard
+    batch = read_json(os.path.join(batch_dir, BATCH_NAME))
+    deadline = time.time() + timeout
+    while time.time() < deadline and process.poll() is None:
+        for shard in batch["shards"]:
+            progress = lease_info(os.path.join(batch_dir, "progress", shard + ".json")) or {}
+            if progress.get("worker") == worker and 0 < progress["images"] < progress["total"]:
+                return shard
+        time.sleep(0.05)
+    return None
+
+
+def run_smoke(work_dir, workers=3, images=12, shard_size=3, size=1500, lease_seconds=3.0, timeout=120):
+    batch_dir = os.path.join(work_dir, "batch")
+    output_dir = os.path.join(work_dir, "out")
+    inputs = make_images(work_dir, images, size)
+    create_batch(batch_dir, inputs, output_dir, shard_size, {"vertical": [size // 3, 2 * size // 3],
+                                                              "horizontal": [size // 2], "ext": ".png"})
+    processes = {f"smoke-{i}": start_worker(batch_dir, f"smoke-{i}", lease_seconds) for i in range(workers)}
+    victim = next(iter(processes))
+    killed = wait_mid_shard(batch_dir, victim, processes[victim], timeout)
+    if killed is None:
+        raise RuntimeError(f"{victim} never got caught mid-shard; use more or larger images")
+    processes[victim].send_signal(signal.SIGKILL)
+    for process in processes.values():
+        process.wait(timeout)
+    # survivors may have run out of claimable shards before the victim's lease ran out; a late
+    # worker takes over whatever is left once it has
+    deadline = time.time() + timeout
+    late = 0
+    while batch_status(batch_dir)["done"] < batch_status(batch_dir)["shards"]:
+        if time.time() > deadline:
+            raise RuntimeError("batch did not finish")
+        time.sleep(lease_seconds)
+        start_worker(batch_dir, f"smoke-late-{late}", lease_seconds).wait(timeout)
+        late += 1
+    return {"killed": killed, "status": batch_status(batch_dir), "verify": verify_export(output_dir)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="batch_smoke",
+                                     description="Run several batch workers on generated images, kill one mid-shard "
+                                                 "and check the batch still completes with a clean export.")
+    parser.add_argument("--workers", type=int, default=3)
+    parser.add_argument("--images", type=int, default=12)
+    parser.add_argument("--shard-size", type=int, default=3)
+    parser.add_argument("--size", type=int, default=1500, help="side of the generated images in pixels")
+    parser.add_argument("--lease", type=float, default=3.0, help="lease length in seconds")
+    parser.add_argument("--keep", help="work in this folder and keep it instead of a temporary one")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        work_dir = args.keep or tmp
+        os.makedirs(work_dir, exist_ok=True)
+        result = run_smoke(work_dir, args.workers, args.images, args.shard_size, args.size, args.lease)
+    s, report = result["status"], result["verify"]
+    print(f"killed smoke-0 during {result['killed']}")
+    print(f"shards: {s['done']}/{s['shards']} done, images: {s['images_done']}/{s['images']}, "
+          f"failed: {len(s['errors'])}")
+    print(f"verify: {report['checked']} checked, {len(report['missing'])} missing, "
+          f"{len(report['corrupted'])} corrupted, {len(report['extra'])} extra")
+    if s["errors"] or report["missing"] or report["corrupted"] or report["extra"] or s["done"] < s["shards"]:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import numpy as np
+
+
+class CellSelection:
+    # one flag per grid cell, indexed [row, col]; guides splitting or merging cells reshape the
+    # mask in place, so picks elsewhere in the grid survive guide edits
+    def __init__(self, rows=1, cols=1):
+        self.mask = np.ones((rows, cols), dtype=bool)
+
+    @property
+    def shape(self):
+        return self.mask.shape
+
+    def reset(self, rows, cols):
+        self.mask = np.ones((rows, cols), dtype=bool)
+
+    def fit(self, rows, cols):
+        if self.mask.shape != (rows, cols):
+            self.reset(rows, cols)
+
+    def split(self, axis, index):
+        # a new guide cuts row/column `index` in two; both halves keep its flags
+        axis = 1 if axis == "vertical" else 0
+        self.mask = np.insert(self.mask, index, np.take(self.mask, index, axis=axis), axis=axis)
+
+    def merge(self, axis, index):
+        # removing the guide after row/column `index` joins it with the next one; the merged
+        # cell stays selected if either half was
+        axis = 1 if axis == "vertical" else 0
+        merged = np.take(self.mask, index, axis=axis) | np.take(self.mask, index + 1, axis=axis)
+        self.mask = np.delete(self.mask, index + 1, axis=axis)
+        if axis:
+            self.mask[:, index] = merged
+        else:
+            self.mask[index] = merged
+
+    def flags(self):
+        # grid order used by export: column by column, top to bottom
+        return self.mask.T.ravel().tolist()
+
+    def set_flags(self, flags, rows, cols):
+        values = np.ones(rows * cols, dtype=bool)
+        flags = list(flags)[:rows * cols]
+        values[:len(flags)] = flags
+        self.mask = values.reshape(cols, rows).T.copy()
+
+    def count(self):
+        return int(self.mask.sum())
+
+    def is_selected(self, row, col):
+        return bool(self.mask[row, col])
+
+    def toggle(self, row, col):
+        self.mask[row, col] = not self.mask[row, col]
+
+    def select_all(self):
+        self.mask[:] = True
+
+    def select_none(self):
+        self.mask[:] = False
+
+    def invert(self):
+        np.logical_not(self.mask, out=self.mask)
+
+    def select_rect(self, row1, col1, row2, col2, value=True):
+        # inclusive cell range, corners in any order
+        r1, r2 = sorted((row1, row2))
+        c1, c2 = sorted((col1, col2))
+        self.mask[r1:r2 + 1, c1:c2 + 1] = value
+
+    def select_every(self, axis, step, start=0):
+        # keeps every `step`-th column ("vertical") or row ("horizontal") and clears the rest
+        lines = np.zeros(self.mask.shape[1 if axis == "vertical" else 0], dtype=bool)
+        lines[start::max(step, 1)] = True
+        self.mask[:] = lines[None, :] if axis == "vertical" else lines[:, None]
+
+    def select_where(self, predicate):
+        # predicate: boolean array shaped like the grid, e.g. ~blank_cells(...)
+        self.mask[:] = np.asarray(predicate, dtype=bool).reshape(self.mask.shape)
@@ -0,0 +1,75 @@
+import io
+import csv
+import json
+import math
+import numpy as np
+from PIL import Image
+from app.tile_filter import ALPHA_THRESHOLD
+
+STATS_FORMATS = ("csv", "json")
+HISTOGRAM_BINS = 16
+# larger crops are measured on a strided subsample of about this many pixels
+SAMPLE_PIXELS = 1 << 18
+LUMA = np.array([0.299, 0.587, 0.114])
+COLUMNS = ("index", "filename", "x1", "y1", "x2", "y2", "mean_r", "mean_g", "mean_b", "alpha_coverage", "entropy",
+           "histogram")
+
+
+def stats_name(fmt):
+    return f"export_stats.{fmt}"
+
+
+def sample(crop, max_pixels=SAMPLE_PIXELS):
+    step = max(1, math.ceil(math.sqrt(crop.width * crop.height / max_pixels)))
+    if step > 1:
+        # nearest-neighbour resize is a strided pick of every step-th pixel
+        crop = crop.resize((max(crop.width // step, 1), max(crop.height // step, 1)), Image.Resampling.NEAREST)
+    return np.asarray(crop.convert("RGBA"))
+
+
+def crop_stats(crop):
+    # mean colour, luminance histogram and entropy over visible pixels; histogram bins are shares
+    pixels = sample(crop)
+    visible = pixels[:, :, 3] > ALPHA_THRESHOLD
+    coverage = float(visible.mean()) if visible.size else 0.0
+    color = pixels[:, :, :3][visible]
+    if not len(color):
+        return {"mean": [0.0, 0.0, 0.0], "alpha_coverage": coverage, "entropy": 0.0,
+                "histogram": [0.0] * HISTOGRAM_BINS}
+    counts = np.bincount((color @ LUMA).astype(np.uint8), minlength=256)
+    shares = counts / counts.sum()
+    nonzero = shares[shares > 0]
+    return {
+        "mean": [round(float(v), 2) for v in color.mean(axis=0)],
+        "alpha_coverage": round(coverage, 4),
+        "entropy": round(float(-(nonzero * np.log2(nonzero)).sum()), 4),
+        "histogram": [round(float(v), 4) for v in shares.reshape(HISTOGRAM_BINS, -1).sum(axis=1)],
+    }
+
+
+def stats_columns(entries):
+    # one list per column, in tile order; entries without stats (tiles from before the option
+    # was turned on) are left out
+    columns = {name: [] for name in COLUMNS}
+    for e in entries:
+        stats = e.get("stats")
+        if not stats:
+            continue
+        x1, y1, x2, y2 = e["box"]
+        r, g, b = stats["mean"]
+        for name, value in zip(COLUMNS, (e["index"], e["name"], x1, y1, x2, y2, r, g, b, stats["alpha_coverage"],
+                                         stats["entropy"], stats["histogram"])):
+            columns[name].append(value)
+    return columns
+
+
+def stats_data(entries, fmt):
+    columns = stats_columns(entries)
+    if fmt == "json":
+        return json.dumps({"bins": HISTOGRAM_BINS, "columns": columns}).encode("utf-8")
+    out = io.StringIO()
+    writer = csv.writer(out, lineterminator="\n")
+    writer.writerow(COLUMNS[:-1] + tuple(f"hist_{i}" for i in range(HISTOGRAM_BINS)))
+    for row in zip(*(columns[name] for name in COLUMNS)):
+        writer.writerow(row[:-1] + tuple(row[-1]))
+    return out.getvalue().encode("utf-8")
@@ -0,0 +1,115 @@
+from PyQt6.QtWidgets import QListView
+from PyQt6.QtGui import QImage, QColor
+from PyQt6.QtCore import (
+    Qt, QSize, QRect, QObject, QRunnable, QThreadPool, QAbstractListModel, QModelIndex, pyqtSignal
+)
+
+THUMB_SIZE = 96
+
+
+class ThumbnailSignals(QObject):
+    done = pyqtSignal(object, QImage)
+
+
+class ThumbnailTask(QRunnable):
+    def __init__(self, key, raster, rect, signals):
+        super().__init__()
+        self.key = key
+        self.raster = raster
+        self.rect = rect
+        self.signals = signals
+
+    def run(self):
+        thumb = self.raster.copy(QRect(*self.rect)).scaled(
+            THUMB_SIZE, THUMB_SIZE, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation
+        )
+        self.signals.done.emit(self.key, thumb)
+
+
+class CropThumbnailModel(QAbstractListModel):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.raster = None
+        self.cells = []
+        self.labels = []
+        # (raster cache key, cell rect) -> thumbnail, so unchanged cells survive guide moves
+        self.cache = {}
+        self.pending = set()
+        self.signals = ThumbnailSignals()
+        self.signals.done.connect(self.on_thumbnail)
+        self.pool = QThreadPool.globalInstance()
+        self.placeholder = QImage(THUMB_SIZE, THUMB_SIZE, QImage.Format.Format_RGB32)
+        self.placeholder.fill(QColor("#e0e0e0"))
+
+    def set_cells(self, raster, cells, labels):
+        raster_key = raster.cacheKey() if raster is not None else None
+        keep = {(raster_key, rect) for rect in cells}
+        self.cache = {k: v for k, v in self.cache.items() if k in keep}
+        self.pending &= keep
+
+        if len(cells) == len(self.cells) and raster is self.raster:
+            changed = [row for row, rect in enumerate(cells) if rect != self.cells[row] or labels[row] != self.labels[row]]
+            self.cells, self.labels = cells, labels
+            for row in changed:
+                index = self.index(row)
+                self.dataChanged.emit(index, index)
+            return
+
+        self.beginResetModel()
+        self.raster = raster
+        self.cells = cells
+        self.labels = labels
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.cells)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or self.raster is None:
+            return None
+        rect = self.cells[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return self.labels[index.row()]
+        if role == Qt.ItemDataRole.DecorationRole:
+            # only called for visible rows, so thumbnails are generated lazily
+            key = (self.raster.cacheKey(), rect)
+            thumb = self.cache.get(key)
+            if thumb is None:
+                self.request(key, rect)
+                return self.placeholder
+            return thumb
+        return None
+
+    def request(self, key, rect):
+        if key in self.pending:
+            return
+        self.pending.add(key)
+        self.pool.start(ThumbnailTask(key, self.raster, rect, self.signals))
+
+    def on_thumbnail(self, key, thumb):
+        if key not in self.pending:
+            return
+        self.pending.discard(key)
+        self.cache[key] = thumb
+        for row, rect in enumerate(self.cells):
+            if (self.raster.cacheKey(), rect) == key:
+                index = self.index(row)
+                self.dataChanged.emit(index, index, [Qt.ItemDataRole.DecorationRole])
+
+
+class CropStrip(QListView):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.thumbnails = CropThumbnailModel(self)
+        self.setModel(self.thumbnails)
+        self.setUniformItemSizes(True)
+        self.setIconSize(QSize(THUMB_SIZE, THUMB_SIZE))
+        self.setSelectionMode(QListView.SelectionMode.NoSelection)
+        self.setFixedWidth(THUMB_SIZE + 60)
+        self.setStyleSheet("border: 1px solid gray;")
+
+    def show_cells(self, raster, cells, labels):
+        self.thumbnails.set_cells(raster, cells, labels)
+
+    def clear(self):
+        self.thumbnails.set_cells(None, [], [])
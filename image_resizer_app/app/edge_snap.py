@@ -0,0 +1,84 @@
+from bisect import bisect_left
+import numpy as np
+from PyQt6.QtCore import QObject, QRunnable, pyqtSignal
+
+# rows sampled for the column profile and columns sampled for the row profile
+EDGE_SAMPLES = 1024
+# a boundary counts as an edge when its strength is this many deviations above the mean
+EDGE_SIGMA = 2.0
+# snapping reach in display pixels
+SNAP_RADIUS = 8
+
+
+def edge_values(image):
+    # alpha edges matter as much as colour edges on transparent sheets
+    gray = np.asarray(image.convert("L"))
+    if "A" in image.getbands():
+        return gray, np.asarray(image.getchannel("A"))
+    return gray, None
+
+
+def gradient_profile(values, axis, samples=EDGE_SAMPLES):
+    # mean absolute step across every column (axis=1) or row (axis=0) boundary; the other axis is
+    # strided, so positions stay exact while the cost is bounded by `samples`
+    step = max(1, values.shape[1 - axis] // samples)
+    sampled = values[::step] if axis == 1 else values[:, ::step]
+    return np.abs(np.diff(sampled.astype(np.int16), axis=axis)).mean(axis=1 - axis)
+
+
+def edge_peaks(profile, sigma=EDGE_SIGMA):
+    # local maxima well above the image's typical gradient; position k + 1 is the boundary after pixel k
+    if len(profile) < 3:
+        return [], []
+    threshold = profile.mean() + sigma * profile.std()
+    left = np.concatenate(([-1.0], profile[:-1]))
+    right = np.concatenate((profile[1:], [-1.0]))
+    peaks = (profile >= left) & (profile > right) & (profile > threshold)
+    return (np.flatnonzero(peaks) + 1).tolist(), profile[peaks].tolist()
+
+
+class EdgeIndex:
+    def __init__(self, vertical=(), horizontal=(), vertical_strength=(), horizontal_strength=()):
+        # sorted edge positions in image pixels
+        self.vertical = list(vertical)
+        self.horizontal = list(horizontal)
+        self.vertical_strength = list(vertical_strength)
+        self.horizontal_strength = list(horizontal_strength)
+
+    def snap(self, axis, value, radius):
+        edges = self.vertical if axis == "vertical" else self.horizontal
+        i = bisect_left(edges, value)
+        nearest = min(edges[max(i - 1, 0):i + 1], key=lambda e: abs(e - value), default=None)
+        if nearest is None or abs(nearest - value) > radius:
+            return value
+        return nearest
+
+
+def build_edge_index(image, samples=EDGE_SAMPLES, sigma=EDGE_SIGMA):
+    channels = [values for values in edge_values(image) if values is not None]
+    profiles = []
+    for axis in (1, 0):
+        strength = sum(gradient_profile(values, axis, samples) for values in channels)
+        profiles.append(edge_peaks(strength, sigma))
+    (vertical, v_strength), (horizontal, h_strength) = profiles
+    return EdgeIndex(vertical, horizontal, v_strength, h_strength)
+
+
+class EdgeIndexSignals(QObject):
+    done = pyqtSignal(object, object)
+
+
+class EdgeIndexTask(QRunnable):
+    def __init__(self, key, image, signals):
+        super().__init__()
+        self.key = key
+        self.image = image
+        self.signals = signals
+
+    def run(self):
+        try:
+            index = build_edge_index(self.image)
+        except Exception:
+            # snapping is a convenience; guides still work without it
+            index = EdgeIndex()
+        self.signals.done.emit(self.key, index)
@@ -0,0 +1,202 @@
+import os
+import sys
+import json
+import time
+import sqlite3
+import hashlib
+import argparse
+
+BATCH_SIZE = 500
+READ_CHUNK = 1 << 20
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS exports (
+    id INTEGER PRIMARY KEY,
+    source_path TEXT NOT NULL,
+    source_fingerprint TEXT NOT NULL,
+    x1 INTEGER NOT NULL,
+    y1 INTEGER NOT NULL,
+    x2 INTEGER NOT NULL,
+    y2 INTEGER NOT NULL,
+    params TEXT NOT NULL,
+    output_path TEXT NOT NULL UNIQUE,
+    content_hash TEXT NOT NULL,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS exports_by_source ON exports (source_fingerprint, x1, y1, x2, y2, params);
+CREATE INDEX IF NOT EXISTS exports_by_hash ON exports (content_hash);
+"""
+
+COLUMNS = ("source_path", "source_fingerprint", "x1", "y1", "x2", "y2", "params", "output_path", "content_hash", "created")
+
+
+def content_hash(data):
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def file_fingerprint(path):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        while chunk := f.read(READ_CHUNK):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def encode_params(**params):
+    return json.dumps(params, sort_keys=True)
+
+
+class ExportCatalog:
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self.pending = []
+
+    def add(self, source_path, fingerprint, box, params, output_path, digest):
+        x1, y1, x2, y2 = box
+        self.pending.append((os.path.abspath(source_path), fingerprint, x1, y1, x2, y2, params,
+                             os.path.abspath(output_path), digest, time.time()))
+        if len(self.pending) >= BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        with self.conn:
+            self.conn.executemany(
+                f"INSERT OR REPLACE INTO exports ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+                self.pending
+            )
+        self.pending = []
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def by_output(self, output_path):
+        return self.conn.execute(
+            "SELECT * FROM exports WHERE output_path = ?", (os.path.abspath(output_path),)
+        ).fetchall()
+
+    def by_source(self, fingerprint):
+        return self.conn.execute(
+            "SELECT * FROM exports WHERE source_fingerprint = ? ORDER BY x1, y1", (fingerprint,)
+        ).fetchall()
+
+    def by_hash(self, digest):
+        return self.conn.execute("SELECT * FROM exports WHERE content_hash = ?", (digest,)).fetchall()
+
+    def find(self, fingerprint, box, params):
+        return self.conn.execute(
+            "SELECT * FROM exports WHERE source_fingerprint = ? AND x1 = ? AND y1 = ? AND x2 = ? AND y2 = ? "
+            "AND params = ?", (fingerprint, *box, params)
+        ).fetchall()
+
+    def duplicates(self):
+        groups = {}
+        rows = self.conn.execute(
+            "SELECT * FROM exports WHERE content_hash IN "
+            "(SELECT content_hash FROM exports GROUP BY content_hash HAVING COUNT(*) > 1) "
+            "ORDER BY content_hash, created"
+        )
+        for row in rows:
+            groups.setdefault(row["content_hash"], []).append(row)
+        return list(groups.values())
+
+    def missing_outputs(self):
+        return [row for row in self.conn.execute("SELECT * FROM exports") if not os.path.exists(row["output_path"])]
+
+    def orphaned_files(self, directory):
+        known = {row[0] for row in self.conn.execute("SELECT output_path FROM exports")}
+        orphans = []
+        for root, _, files in os.walk(directory):
+            for name in files:
+                path = os.path.abspath(os.path.join(root, name))
+                if name.lower().endswith(IMAGE_EXTENSIONS) and path not in known:
+                    orphans.append(path)
+        return orphans
+
+    def remove(self, ids):
+        with self.conn:
+            self.conn.executemany("DELETE FROM exports WHERE id = ?", [(i,) for i in ids])
+
+
+def print_rows(rows):
+    for row in rows:
+        print(f"{row['output_path']}\t{row['source_path']}\t{row['x1']},{row['y1']},{row['x2']},{row['y2']}\t"
+              f"{row['params']}\t{row['content_hash']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="export_catalog", description="Query the export catalog.")
+    parser.add_argument("catalog")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    lookup = commands.add_parser("lookup", help="find which source and rect produced a tile")
+    group = lookup.add_mutually_exclusive_group(required=True)
+    group.add_argument("--output", help="exported tile path")
+    group.add_argument("--source", help="source image path")
+    group.add_argument("--hash", help="content hash")
+
+    dedupe = commands.add_parser("dedupe", help="list tiles with identical content")
+    dedupe.add_argument("--delete", action="store_true", help="delete all but the oldest copy")
+
+    gc = commands.add_parser("gc", help="drop entries for missing tiles and find untracked tiles")
+    gc.add_argument("--dir", help="output folder to scan for tiles the catalog does not know")
+    gc.add_argument("--delete", action="store_true", help="actually delete entries and files")
+
+    args = parser.parse_args(argv)
+    if not os.path.exists(args.catalog):
+        parser.error(f"catalog not found: {args.catalog}")
+
+    with ExportCatalog(args.catalog) as catalog:
+        if args.command == "lookup":
+            if args.output:
+                rows = catalog.by_output(args.output)
+            elif args.source:
+                rows = catalog.by_source(file_fingerprint(args.source))
+            else:
+                rows = catalog.by_hash(args.hash)
+            print_rows(rows)
+            return 0 if rows else 1
+
+        if args.command == "dedupe":
+            removed = []
+            for group in catalog.duplicates():
+                print_rows(group)
+                print()
+                if args.delete:
+                    for row in group[1:]:
+                        if os.path.exists(row["output_path"]):
+                            os.remove(row["output_path"])
+                        removed.append(row["id"])
+            catalog.remove(removed)
+            print(f"{len(removed)} duplicate tile(s) deleted.")
+            return 0
+
+        missing = catalog.missing_outputs()
+        orphans = catalog.orphaned_files(args.dir) if args.dir else []
+        for row in missing:
+            print(f"missing\t{row['output_path']}")
+        for path in orphans:
+            print(f"orphan\t{path}")
+        if args.delete:
+            catalog.remove([row["id"] for row in missing])
+            for path in orphans:
+                os.remove(path)
+        print(f"{len(missing)} missing tile(s), {len(orphans)} orphaned file(s)" + (" removed." if args.delete else "."))
+        return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,39 +1,365 @@
-
 import os
+import sys
 import hashlib
 import random
+import argparse
 from PIL import Image
+from app.export_journal import ExportJournal, encode_image
+from app.export_sinks import DirectorySink, open_sink
+from app.band_reader import BandReader
+from app.export_catalog import ExportCatalog, content_hash, encode_params, file_fingerprint
+from app.auto_guides import DEFAULT_TOLERANCE, detect_guides
+from app import sprite_slicer
+from app.archive_source import ARCHIVE_EXTENSIONS, is_archive, iter_archive_images, member_path
+from app.tile_filter import BLANK_TOLERANCE, DEDUPE_MODES, TileFilter
+from app.export_verify import MANIFEST_NAME, manifest_data
+from app.crop_stats import STATS_FORMATS, crop_stats, stats_data, stats_name
+
+LOG_NAME = "export_log.txt"
 
 def generate_filename(base, index, suffix, ext):
     hash_part = hashlib.sha256(str(random.random()).encode()).hexdigest()[:8]
     return f"{base}-{index}-{hash_part}{suffix}{ext}"
 
-def export_crops(image_path, vertical_lines, horizontal_lines, output_dir, prefix="cropped", suffix="", ext=".jpg"):
-    image = Image.open(image_path)
-    image_width, image_height = image.size
-
-    os.makedirs(output_dir, exist_ok=True)
-
-    x_lines = [0] + sorted(vertical_lines) + [image_width]
-    y_lines = [0] + sorted(horizontal_lines) + [image_height]
+def grid_lines(size, vertical_lines, horizontal_lines):
+    width, height = size
+    return [0] + sorted(vertical_lines) + [width], [0] + sorted(horizontal_lines) + [height]
 
-    crop_index = 1
+def grid_boxes(x_lines, y_lines):
     for i in range(len(x_lines) - 1):
         for j in range(len(y_lines) - 1):
-            x1, x2 = x_lines[i], x_lines[i + 1]
-            y1, y2 = y_lines[j], y_lines[j + 1]
-            cropped = image.crop((x1, y1, x2, y2))
-            filename = generate_filename(prefix, crop_index, suffix, ext)
-            cropped.save(os.path.join(output_dir, filename))
-            crop_index += 1
+            yield x_lines[i], y_lines[j], x_lines[i + 1], y_lines[j + 1]
+
+def resize_crop(crop, percent):
+    if not percent or percent <= 0:
+        return crop
+    w0, h0 = crop.size
+    return crop.resize((int(w0 * percent / 100), int(h0 * percent / 100)), Image.Resampling.LANCZOS)
+
+def prepare_crop(crop, ext):
+    # flatten only what gets encoded; JPEG has no alpha and PNG has no RGBX
+    if ext.lower() in (".jpg", ".jpeg"):
+        if crop.mode not in ("RGB", "L", "CMYK"):
+            crop = crop.convert("RGB")
+    elif crop.mode == "RGBX":
+        crop = crop.convert("RGB")
+    return crop
+
+def plan_crops(size, vertical_lines, horizontal_lines, boxes=None, includes=None):
+    if boxes is None:
+        x_lines, y_lines = grid_lines(size, vertical_lines, horizontal_lines)
+        boxes = list(grid_boxes(x_lines, y_lines))
+    else:
+        boxes = [tuple(box) for box in boxes]
+    if includes is None:
+        includes = [True] * len(boxes)
+    return boxes, list(includes[:len(boxes)])
+
+def crop_numbers(includes):
+    numbers = {}
+    for grid_idx, flag in enumerate(includes):
+        if flag:
+            numbers[grid_idx] = len(numbers) + 1
+    return numbers
+
+def iter_bands(image, reader, pending):
+    if reader is None:
+        yield image, 0, pending
+        return
+    # one band per distinct row span, top to bottom; only that band is resident
+    bands = {}
+    for grid_idx, box in pending:
+        bands.setdefault((box[1], box[3]), []).append((grid_idx, box))
+    for (y1, y2), band_boxes in sorted(bands.items()):
+        band, offset = reader.read(y1, y2)
+        yield band, offset, band_boxes
+        del band
+
+def written_entries(entries):
+    # entries that own a file; blank and duplicate tiles are only listed in the log
+    return [e for e in entries if not e.get("skipped")]
+
+def log_data(entries):
+    if any(e.get("skipped") for e in entries):
+        lines = ["filename,x1,y1,x2,y2,skipped\n"]
+        lines += [f"{e['name'] or ''},{','.join(str(v) for v in e['box'])},{e.get('skipped', '')}\n"
+                  for e in entries]
+    else:
+        lines = ["filename,x1,y1,x2,y2\n"]
+        lines += [f"{e['name']},{','.join(str(v) for v in e['box'])}\n" for e in entries]
+    return "".join(lines).encode("utf-8")
+
+def entry_checksums(entries, output_dir):
+    # tiles journalled before checksums were recorded are hashed from disk once, on resume
+    return [(e["name"], e.get("checksum") or file_fingerprint(os.path.join(output_dir, e["name"])))
+            for e in written_entries(entries)]
+
+def export_crops(image_path, vertical_lines, horizontal_lines, output_dir, prefix="cropped", suffix="", ext=".jpg",
+                 includes=None, resize_percent=None, resume=False, image=None, catalog=None, boxes=None,
+                 stream=False, tile_filter=None, sink=None, stats=None):
+    reader = None
+    if image is None:
+        if stream:
+            reader = BandReader(image_path)
+        else:
+            image = Image.open(image_path)
+    size = reader.size if reader else image.size
+    boxes, includes = plan_crops(size, vertical_lines, horizontal_lines, boxes, includes)
+
+    own_sink = sink is None
+    if own_sink:
+        sink = DirectorySink(output_dir).open()
+    try:
+        entries = write_crops(image_path, image, reader, boxes, includes, sink, prefix, suffix, ext, resize_percent,
+                              resume, catalog, tile_filter, stats)
+    except BaseException:
+        if own_sink:
+            # waits for in-flight writes so no pool thread or half-written .part file outlives the call
+            sink.abort()
+        raise
+    finally:
+        if reader:
+            reader.close()
+    if own_sink:
+        sink.close()
+    return entries
+
+def write_crops(image_path, image, reader, boxes, includes, sink, prefix, suffix, ext, resize_percent, resume,
+                catalog, tile_filter, stats):
+    # only tiles that land in a folder can be journalled for resume or catalogued
+    output_dir = sink.output_dir
+    if not output_dir:
+        resume, catalog = False, None
+
+    job = {
+        "source": os.path.abspath(image_path),
+        "boxes": boxes,
+        "includes": [bool(flag) for flag in includes[:len(boxes)]],
+        "prefix": prefix,
+        "suffix": suffix,
+        "ext": ext,
+        "resize": resize_percent,
+    }
+    if tile_filter:
+        job["filter"] = [tile_filter.skip_blank, tile_filter.dedupe, tile_filter.tolerance]
+    if catalog:
+        fingerprint = file_fingerprint(image_path)
+        params = encode_params(ext=ext, resize=resize_percent)
+
+    # file numbers follow grid order even when bands are processed row by row
+    numbers = crop_numbers(includes)
+
+    written = {}
+
+    def record_written(names):
+        for name in names:
+            if name in written:
+                grid_idx, box, data, extra = written.pop(name)
+                # hashed from the encoded bytes, so the manifest costs no extra read
+                checksum = content_hash(data)
+                journal.record(grid_idx, name, box, len(data), checksum=checksum, **extra)
+                if catalog:
+                    catalog.add(image_path, fingerprint, box, params, os.path.join(output_dir, name), checksum)
+
+    with ExportJournal(output_dir, job, resume=resume) as journal:
+        pending = [(grid_idx, boxes[grid_idx]) for grid_idx in numbers if not journal.is_done(grid_idx)]
+        if tile_filter:
+            for entry in written_entries(journal.entries()):
+                tile_filter.remember(entry.get("hash"), entry["name"])
+        for band, offset, band_boxes in iter_bands(image, reader, pending):
+            for grid_idx, box in band_boxes:
+                x1, y1, x2, y2 = box
+                cropped = prepare_crop(resize_crop(band.crop((x1, y1 - offset, x2, y2 - offset)), resize_percent), ext)
+                key = None
+                if tile_filter:
+                    reason, original, key = tile_filter.check(cropped)
+                    if reason:
+                        journal.record_skipped(grid_idx, box, reason, original)
+                        continue
+                filename = generate_filename(prefix, numbers[grid_idx], suffix, ext)
+                data = encode_image(cropped, filename)
+                extra = {"hash": key} if key else {}
+                if stats:
+                    # measured on the crop already in memory; journalled so resumed runs keep it
+                    extra["stats"] = crop_stats(cropped)
+                written[filename] = (grid_idx, box, data, extra)
+                # the name is journalled before the write, so a crash never leaves an untracked tile
+                journal.record_intent(grid_idx, filename)
+                sink.write(filename, data)
+                if tile_filter:
+                    tile_filter.remember(key, filename)
+                record_written(sink.drain())
+        sink.flush()
+        record_written(sink.drain())
+        entries = journal.entries()
+        sidecars = {LOG_NAME: log_data(entries)}
+        if stats:
+            sidecars[stats_name(stats)] = stats_data(written_entries(entries), stats)
+        for name, data in sidecars.items():
+            sink.write(name, data)
+        checksums = entry_checksums(entries, output_dir) + [(name, content_hash(data)) for name, data in sidecars.items()]
+        sink.write(MANIFEST_NAME, manifest_data(checksums))
+        sink.flush()
+        sink.drain()
+        if catalog:
+            catalog.flush()
+        journal.finish()
+    return entries
+
+def dry_run(image_path, vertical, horizontal, output_dir, args, boxes=None, image=None):
+    # imported here because the estimator reuses the crop helpers above
+    from app.export_estimate import DEFAULT_MEMORY_BUDGET, estimate_export
+
+    budget = args.memory_budget * 1024 * 1024 if args.memory_budget else DEFAULT_MEMORY_BUDGET
+    owned = image is None
+    reader = BandReader(image_path) if args.stream and owned else None
+    if owned and not reader:
+        image = Image.open(image_path)
+    try:
+        size = reader.size if reader else image.size
+        boxes, includes = plan_crops(size, vertical, horizontal, boxes)
+        estimate = estimate_export(image, boxes, includes, output_dir, args.ext, args.resize,
+                                   memory_budget=budget, reader=reader)
+    finally:
+        if owned:
+            (reader or image).close()
+    print(f"Dry run for {image_path} -> {output_dir}")
+    for line in estimate.summary():
+        print(f"  {line}")
+    for warning in estimate.warnings():
+        print(f"  WARNING: {warning}")
+    return estimate
+
+def split_ext(name):
+    lower = name.lower()
+    for ext in ARCHIVE_EXTENSIONS:
+        if lower.endswith(ext):
+            return name[:-len(ext)], name[-len(ext):]
+    return os.path.splitext(name)
+
+def unique_folder(folder, ext, used):
+    # same-named inputs (scan.png and scan.jpg, two archives' scan.png) get distinct folders;
+    # compared case-insensitively since Windows and macOS folders are
+    candidate = folder
+    if candidate.lower() in used:
+        candidate = f"{folder}-{ext.lstrip('.').lower()}"
+    n = 2
+    while candidate.lower() in used:
+        candidate = f"{folder}-{n}"
+        n += 1
+    used.add(candidate.lower())
+    return candidate
+
+def input_folders(paths):
+    # output subfolder per input: its path below the inputs' common folder, without extension
+    root = os.path.commonpath([os.path.dirname(os.path.abspath(p)) for p in paths]) if paths else ""
+    used = set()
+    folders = {}
+    for path in paths:
+        if path not in folders:
+            folders[path] = unique_folder(*split_ext(os.path.relpath(os.path.abspath(path), root)), used)
+    return folders
+
+def iter_sources(paths):
+    # (path, decoded image or None, output subfolder) for plain files and for every image inside
+    # ZIP/tar inputs, whose members are streamed rather than extracted
+    folders = input_folders(paths)
+    for path in folders:
+        if is_archive(path):
+            used = set()
+            for name, image in iter_archive_images(path):
+                relative = unique_folder(*os.path.splitext(member_path(name)), used)
+                yield f"{path}/{name}", image, os.path.join(folders[path], relative) if len(folders) > 1 else relative
+                image.close()
+        else:
+            yield path, None, folders[path] if len(folders) > 1 else None
+
+def parse_lines(text):
+    return [int(v) for v in text.split(",") if v.strip()]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="export_crops", description="Slice images along guide lines.")
+    parser.add_argument("images", nargs="+", help="image files, or ZIP/tar archives of images")
+    parser.add_argument("-o", "--output-dir", default="exports",
+                        help="folder, .zip, .tar or .tar.gz archive, or - to stream a tar to stdout")
+    parser.add_argument("-x", "--vertical", type=parse_lines, default=[], help="comma separated x positions")
+    parser.add_argument("-y", "--horizontal", type=parse_lines, default=[], help="comma separated y positions")
+    parser.add_argument("--prefix", default="cropped")
+    parser.add_argument("--suffix", default="")
+    parser.add_argument("--ext", default=".jpg")
+    parser.add_argument("--resize", type=float, default=None, help="resize crops by percent")
+    parser.add_argument("--resume", action="store_true", help="skip crops completed by an interrupted run")
+    parser.add_argument("--catalog", help="SQLite catalog to record exported tiles in")
+    parser.add_argument("--stream", action="store_true",
+                        help="decode one row band at a time; only uncompressed TIFF/PPM/BMP stream, other formats "
+                             "are decoded whole and keep Pillow's image size limit")
+    parser.add_argument("--dry-run", action="store_true", help="estimate size, memory and time without exporting")
+    parser.add_argument("--memory-budget", type=int, default=None, help="warn above this many MB of peak memory")
+    parser.add_argument("--skip-blank", action="store_true", help="do not write uniform or fully transparent tiles")
+    parser.add_argument("--blank-tolerance", type=int, default=BLANK_TOLERANCE)
+    parser.add_argument("--dedupe", choices=DEDUPE_MODES, default=None,
+                        help="write repeated tiles once and reference them in the export log")
+    parser.add_argument("--stats", choices=STATS_FORMATS, default=None,
+                        help="write per-tile mean colour, histogram, entropy and alpha coverage beside the log")
+    parser.add_argument("--auto-guides", action="store_true", help="add guides at uniform gutters")
+    parser.add_argument("--gutter-tolerance", type=int, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--sprites", action="store_true", help="export each foreground region instead of a grid")
+    parser.add_argument("--sprite-threshold", type=int, default=sprite_slicer.DEFAULT_THRESHOLD,
+                        help="alpha or background color difference that counts as foreground")
+    parser.add_argument("--sprite-merge", type=int, default=sprite_slicer.DEFAULT_MERGE_DISTANCE,
+                        help="merge regions closer than this many pixels")
+    parser.add_argument("--sprite-min-size", type=int, default=sprite_slicer.DEFAULT_MIN_SIZE)
+    args = parser.parse_args(argv)
 
-    print(f"Exported {crop_index - 1} cropped images to: {output_dir}")
+    catalog = ExportCatalog(args.catalog) if args.catalog else None
+    archive = open_sink(args.output_dir)
+    if isinstance(archive, DirectorySink) or args.dry_run:
+        archive = None
+    else:
+        archive.open()
+    # keep stdout clean when it carries the archive
+    report = sys.stderr if args.output_dir == "-" else sys.stdout
+    try:
+        for image_path, image, relative in iter_sources(args.images):
+            output_dir = os.path.join(args.output_dir, relative) if relative else args.output_dir
+            if args.stream and image is None and not BandReader(image_path).streaming:
+                print(f"WARNING: {image_path} is compressed and cannot be streamed; decoding it whole", file=sys.stderr)
+            vertical, horizontal, boxes = args.vertical, args.horizontal, None
+            if args.sprites or args.auto_guides:
+                source = image if image is not None else Image.open(image_path)
+                try:
+                    if args.sprites:
+                        boxes = sprite_slicer.detect_sprites(source, args.sprite_threshold, args.sprite_merge,
+                                                             args.sprite_min_size)
+                    else:
+                        found_x, found_y = detect_guides(source, args.gutter_tolerance)
+                        vertical = sorted(set(vertical) | set(found_x))
+                        horizontal = sorted(set(horizontal) | set(found_y))
+                finally:
+                    if image is None:
+                        source.close()
+            if args.dry_run:
+                dry_run(image_path, vertical, horizontal, output_dir, args, boxes, image)
+                continue
+            sink = None
+            if archive:
+                sink = archive.scoped(relative.replace(os.sep, "/")) if relative else archive
+            tile_filter = None
+            if args.skip_blank or args.dedupe:
+                tile_filter = TileFilter(args.skip_blank, args.dedupe, args.blank_tolerance)
+            entries = export_crops(image_path, vertical, horizontal, output_dir, args.prefix, args.suffix,
+                                   args.ext, resize_percent=args.resize, resume=args.resume,
+                                   catalog=catalog if image is None else None, image=image, boxes=boxes,
+                                   stream=args.stream, tile_filter=tile_filter, sink=sink, stats=args.stats)
+            print(f"Exported {len(written_entries(entries))} cropped images to: {output_dir}", file=report)
+        if archive:
+            archive.close()
+            archive = None
+    finally:
+        if archive:
+            archive.abort()
+        if catalog:
+            catalog.close()
 
-# Example usage (you can delete or replace this with your app call):
 if __name__ == "__main__":
-    export_crops(
-        image_path="sample_image.jpg",
-        vertical_lines=[200, 400, 600],
-        horizontal_lines=[150, 450],
-        output_dir="exports"
-    )
+    main()
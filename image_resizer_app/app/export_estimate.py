@@ -0,0 +1,154 @@
+import os
+import time
+import shutil
+import zlib
+from PIL import Image
+from app.export_crops import prepare_crop, resize_crop
+from app.export_journal import encode_image
+
+SAMPLE_CELLS = 5
+DEFAULT_MEMORY_BUDGET = 2048 * 1024 * 1024
+# rough cost of the temp file, fsync and rename done for every written tile
+FILE_OVERHEAD_SECONDS = 0.002
+
+
+def format_bytes(count):
+    for unit in ("B", "KB", "MB", "GB"):
+        if abs(count) < 1024:
+            return f"{count:.0f} {unit}" if unit == "B" else f"{count:.1f} {unit}"
+        count /= 1024
+    return f"{count:.1f} TB"
+
+
+def format_seconds(seconds):
+    if seconds < 60:
+        return f"{seconds:.1f} s"
+    minutes, seconds = divmod(int(seconds), 60)
+    if minutes < 60:
+        return f"{minutes} min {seconds} s"
+    return f"{minutes // 60} h {minutes % 60} min"
+
+
+def output_size(box, resize_percent):
+    w, h = box[2] - box[0], box[3] - box[1]
+    if resize_percent and resize_percent > 0:
+        return int(w * resize_percent / 100), int(h * resize_percent / 100)
+    return w, h
+
+
+def sample_boxes(boxes, count=SAMPLE_CELLS):
+    # evenly spaced picks over the cells ordered by area cover small and large tiles alike
+    ordered = sorted(boxes, key=lambda b: (b[2] - b[0]) * (b[3] - b[1]))
+    if len(ordered) <= count:
+        return ordered
+    step = (len(ordered) - 1) / (count - 1)
+    return [ordered[round(i * step)] for i in range(count)]
+
+
+def free_space(path):
+    path = os.path.abspath(path)
+    while not os.path.exists(path):
+        parent = os.path.dirname(path)
+        if parent == path:
+            break
+        path = parent
+    return shutil.disk_usage(path).free
+
+
+class ExportEstimate:
+    def __init__(self, count, total_bytes, disk_bytes, peak_memory, seconds, free_bytes,
+                 memory_budget=DEFAULT_MEMORY_BUDGET, decode_seconds=0.0):
+        self.count = count
+        self.total_bytes = total_bytes
+        self.disk_bytes = disk_bytes
+        self.peak_memory = peak_memory
+        self.seconds = seconds
+        self.free_bytes = free_bytes
+        self.memory_budget = memory_budget
+        # part of `seconds`: the one-off source decode, paid once however many tiles there are
+        self.decode_seconds = decode_seconds
+
+    def repeated(self, times):
+        # the same grid cut from `times` frames; memory stays that of one frame
+        return ExportEstimate(self.count * times, self.total_bytes * times, self.disk_bytes * times, self.peak_memory,
+                              self.seconds * times, self.free_bytes, self.memory_budget, self.decode_seconds * times)
+
+    def warnings(self):
+        warnings = []
+        if self.disk_bytes > self.free_bytes:
+            warnings.append(f"needs about {format_bytes(self.disk_bytes)} but only "
+                            f"{format_bytes(self.free_bytes)} is free")
+        if self.memory_budget and self.peak_memory > self.memory_budget:
+            warnings.append(f"peak memory {format_bytes(self.peak_memory)} exceeds the "
+                            f"{format_bytes(self.memory_budget)} budget")
+        return warnings
+
+    def summary(self):
+        return [
+            f"{self.count} tiles, about {format_bytes(self.total_bytes)} of output",
+            f"disk needed: {format_bytes(self.disk_bytes)} ({format_bytes(self.free_bytes)} free)",
+            f"peak memory: {format_bytes(self.peak_memory)}",
+            f"estimated time: {format_seconds(self.seconds)} (decode {format_seconds(self.decode_seconds)})",
+        ]
+
+
+def estimate_export(image, boxes, includes, output_dir, ext=".jpg", resize_percent=None, zip_output=False,
+                    memory_budget=DEFAULT_MEMORY_BUDGET, reader=None):
+    planned = [box for box, flag in zip(boxes, includes) if flag]
+    if not planned:
+        return ExportEstimate(0, 0, 0, 0, 0.0, free_space(output_dir), memory_budget)
+    path = "sample" + ext
+
+    def crop(box):
+        if reader is None:
+            return image.crop(box)
+        band, offset = reader.read(box[1], box[3])
+        return band.crop((box[0], box[1] - offset, box[2], box[3] - offset))
+
+    # lazily opened sources decode on first access; timed apart so the samples below only measure
+    # per-tile work, which is what gets scaled up
+    start = time.perf_counter()
+    if reader is None:
+        image.load()
+    else:
+        reader.read(planned[0][1], planned[0][3])
+    decode_seconds = time.perf_counter() - start
+
+    sampled_pixels = sampled_bytes = packed_bytes = 0
+    encode_seconds = zip_seconds = 0.0
+    for box in sample_boxes(planned):
+        start = time.perf_counter()
+        data = encode_image(prepare_crop(resize_crop(crop(box), resize_percent), ext), path)
+        encode_seconds += time.perf_counter() - start
+        w, h = output_size(box, resize_percent)
+        sampled_pixels += max(w * h, 1)
+        sampled_bytes += len(data)
+        if zip_output:
+            start = time.perf_counter()
+            packed_bytes += len(zlib.compress(data, 6))
+            zip_seconds += time.perf_counter() - start
+
+    sizes = [output_size(box, resize_percent) for box in planned]
+    pixels = sum(max(w * h, 1) for w, h in sizes)
+    scale = pixels / sampled_pixels
+    total_bytes = int(sampled_bytes * scale)
+    seconds = decode_seconds + encode_seconds * scale + FILE_OVERHEAD_SECONDS * len(planned)
+    if zip_output:
+        # tiles are streamed into the archive, so only the archive itself lands on disk
+        total_bytes = int(packed_bytes * scale)
+        seconds += zip_seconds * scale
+    disk_bytes = total_bytes
+
+    mode, (width, height) = (reader.mode, reader.size) if reader else (image.mode, image.size)
+    bands = Image.getmodebands(mode)
+    rows = height
+    if reader is not None and reader.streaming:
+        rows = max(box[3] - box[1] for box in planned)
+    source_bytes = width * rows * bands
+    largest = max(planned, key=lambda b: (b[2] - b[0]) * (b[3] - b[1]))
+    crop_bytes = (largest[2] - largest[0]) * (largest[3] - largest[1]) * bands
+    out_w, out_h = output_size(largest, resize_percent)
+    # crop, resized copy and encoded buffer of the biggest tile on top of the source
+    peak_memory = source_bytes + crop_bytes + out_w * out_h * bands * 2
+    return ExportEstimate(len(planned), total_bytes, disk_bytes, peak_memory, seconds,
+                          free_space(output_dir), memory_budget, decode_seconds)
@@ -0,0 +1,191 @@
+import io
+import os
+import json
+import hashlib
+from PIL import Image
+
+JOURNAL_NAME = "export_journal.jsonl"
+TEMP_SUFFIX = ".part"
+# how many of the most recent journal entries are re-checked on resume
+VERIFY_TAIL = 8
+
+
+def image_format(path):
+    return Image.registered_extensions()[os.path.splitext(path)[1].lower()]
+
+
+def fsync_dir(path):
+    if os.name == "nt":
+        return
+    fd = os.open(path or ".", os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def atomic_write(path, write):
+    tmp = path + TEMP_SUFFIX
+    try:
+        with open(tmp, "wb") as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    fsync_dir(os.path.dirname(path))
+
+
+def encode_image(image, path, **params):
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format(path), **params)
+    return buffer.getvalue()
+
+
+def atomic_save(image, path, **params):
+    data = encode_image(image, path, **params)
+    atomic_write(path, lambda f: f.write(data))
+    return data
+
+
+def job_key(job):
+    return hashlib.sha256(json.dumps(job, sort_keys=True).encode()).hexdigest()
+
+
+class ExportJournal:
+    def __init__(self, output_dir, job, resume=False):
+        # without an output_dir (archive and memory sinks) the journal only lives in memory
+        self.output_dir = output_dir
+        self.path = os.path.join(output_dir, JOURNAL_NAME) if output_dir else None
+        self.key = job_key(job)
+        self.completed = self.load() if resume and self.path else {}
+        self.file = None
+
+    @staticmethod
+    def read_records(path):
+        records = []
+        if not os.path.exists(path):
+            return records
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    # torn write at the tail of the journal
+                    break
+        return records
+
+    @staticmethod
+    def incomplete(output_dir):
+        records = ExportJournal.read_records(os.path.join(output_dir, JOURNAL_NAME))
+        return bool(records) and records[-1].get("type") != "done"
+
+    def load(self):
+        records = self.read_records(self.path)
+        if not records or records[0].get("type") != "job" or records[0].get("key") != self.key:
+            return {}
+        completed = {r["index"]: r for r in records[1:] if r.get("type") == "crop"}
+        # tiles whose write started but never got a completion record may be on disk already;
+        # they are removed so the redo does not leave orphans under a different random name
+        kept = {r["name"] for r in completed.values()}
+        for r in records[1:]:
+            if r.get("type") == "intent" and r["name"] not in kept:
+                path = os.path.join(self.output_dir, r["name"])
+                if os.path.exists(path):
+                    os.remove(path)
+        # the last tiles written, in journal order; parallel and resumed exports do not finish in index order
+        recent = []
+        for r in reversed(records[1:]):
+            if len(recent) == VERIFY_TAIL:
+                break
+            if r.get("type") == "crop" and r["index"] not in recent:
+                recent.append(r["index"])
+        for index in recent:
+            if not self.is_intact(completed[index]):
+                path = os.path.join(self.output_dir, completed.pop(index)["name"])
+                if os.path.exists(path):
+                    os.remove(path)
+        # duplicates pointing at a tile that has to be written again are redone too
+        written = {r["name"] for r in completed.values() if not r.get("skipped")}
+        for index in [i for i, r in completed.items() if r.get("skipped") == "duplicate"]:
+            if completed[index]["name"] not in written:
+                del completed[index]
+        return completed
+
+    def is_intact(self, record):
+        if record.get("skipped"):
+            return True
+        path = os.path.join(self.output_dir, record["name"])
+        if not os.path.isfile(path) or os.path.getsize(path) != record["bytes"]:
+            return False
+        try:
+            with Image.open(path) as im:
+                im.verify()
+        except Exception:
+            return False
+        return True
+
+    def is_done(self, index):
+        return index in self.completed
+
+    def open(self):
+        if not self.path:
+            return self
+        for name in os.listdir(self.output_dir):
+            if name.endswith(TEMP_SUFFIX):
+                os.remove(os.path.join(self.output_dir, name))
+        lines = [{"type": "job", "key": self.key}]
+        lines += [self.completed[i] for i in sorted(self.completed)]
+        data = "".join(json.dumps(r) + "\n" for r in lines).encode("utf-8")
+        atomic_write(self.path, lambda f: f.write(data))
+        self.file = open(self.path, "a", encoding="utf-8")
+        return self
+
+    def append(self, record):
+        if not self.file:
+            return
+        self.file.write(json.dumps(record) + "\n")
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def record(self, index, name, box, size=None, **extra):
+        if size is None:
+            size = os.path.getsize(os.path.join(self.output_dir, name))
+        record = {
+            "type": "crop",
+            "index": index,
+            "name": name,
+            "box": list(box),
+            "bytes": size,
+        }
+        record.update(extra)
+        self.append(record)
+        self.completed[index] = record
+
+    def record_intent(self, index, name):
+        self.append({"type": "intent", "index": index, "name": name})
+
+    def record_skipped(self, index, box, reason, name=None):
+        record = {"type": "crop", "index": index, "name": name, "box": list(box), "bytes": 0, "skipped": reason}
+        self.append(record)
+        self.completed[index] = record
+
+    def entries(self):
+        return [self.completed[i] for i in sorted(self.completed)]
+
+    def finish(self):
+        self.append({"type": "done"})
+
+    def close(self):
+        if self.file:
+            self.file.close()
+            self.file = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,295 @@
+import io
+import os
+import sys
+import time
+import tarfile
+import zipfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from app.export_journal import TEMP_SUFFIX, atomic_write, fsync_dir
+
+# archive writes are gathered into buffers of this size before reaching the file or pipe
+WRITE_BUFFER = 1 << 20
+
+
+class DirectorySink:
+    # tiles are written atomically by a small pool; drain() reports the ones that are durable
+    def __init__(self, output_dir, max_workers=4, max_pending=16):
+        self.output_dir = output_dir
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.pool = ThreadPoolExecutor(max_workers=max_workers)
+        self.slots = threading.BoundedSemaphore(max_pending)
+        self.lock = threading.Lock()
+        self.done = []
+        self.errors = []
+        self.futures = set()
+
+    def path(self, name):
+        return os.path.join(self.output_dir, name)
+
+    def open(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        return self
+
+    def write(self, name, data):
+        self.raise_errors()
+        # blocks once max_pending writes are in flight so encoded tiles never pile up in memory
+        self.slots.acquire()
+        future = self.pool.submit(self.write_file, name, data)
+        with self.lock:
+            self.futures.add(future)
+        future.add_done_callback(self.forget)
+
+    def forget(self, future):
+        with self.lock:
+            self.futures.discard(future)
+
+    def write_file(self, name, data):
+        try:
+            path = self.path(name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            atomic_write(path, lambda f: f.write(data))
+            with self.lock:
+                self.done.append(name)
+        except BaseException as e:
+            with self.lock:
+                self.errors.append(e)
+        finally:
+            self.slots.release()
+
+    def raise_errors(self):
+        with self.lock:
+            if self.errors:
+                raise self.errors[0]
+
+    def drain(self):
+        with self.lock:
+            done, self.done = self.done, []
+        return done
+
+    def flush(self):
+        with self.lock:
+            futures = list(self.futures)
+        wait(futures)
+        self.raise_errors()
+
+    def close(self):
+        self.pool.shutdown(wait=True)
+        self.raise_errors()
+
+    def abort(self):
+        self.pool.shutdown(wait=True)
+
+    def scoped(self, prefix):
+        return DirectorySink(os.path.join(self.output_dir, prefix), self.max_workers, self.max_pending)
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type:
+            self.abort()
+        else:
+            self.close()
+
+
+class StreamSink:
+    # single writer: archive members are appended in order, so a pipe or socket works as the target
+    output_dir = None
+
+    def __init__(self, target):
+        self.target = target
+        self.file = None
+        self.raw = None
+        self.done = []
+
+    def open(self):
+        if self.target == "-":
+            self.raw = sys.stdout.buffer
+        elif isinstance(self.target, (str, os.PathLike)):
+            self.raw = open(os.fspath(self.target) + TEMP_SUFFIX, "wb")
+        else:
+            self.raw = self.target
+        self.file = io.BufferedWriter(NonClosing(self.raw), WRITE_BUFFER)
+        self.open_archive()
+        return self
+
+    def write(self, name, data):
+        self.add_member(name, data)
+        self.done.append(name)
+
+    def drain(self):
+        done, self.done = self.done, []
+        return done
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.close_archive()
+        self.file.flush()
+        if isinstance(self.target, (str, os.PathLike)) and self.target != "-":
+            path = os.fspath(self.target)
+            self.raw.flush()
+            os.fsync(self.raw.fileno())
+            self.raw.close()
+            os.replace(path + TEMP_SUFFIX, path)
+            fsync_dir(os.path.dirname(path))
+
+    def abort(self):
+        if isinstance(self.target, (str, os.PathLike)) and self.target != "-":
+            self.raw.close()
+            if os.path.exists(os.fspath(self.target) + TEMP_SUFFIX):
+                os.remove(os.fspath(self.target) + TEMP_SUFFIX)
+
+    def scoped(self, prefix):
+        return ScopedSink(self, prefix)
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type:
+            self.abort()
+        else:
+            self.close()
+
+
+class ZipSink(StreamSink):
+    def __init__(self, target, compression=zipfile.ZIP_DEFLATED):
+        super().__init__(target)
+        self.compression = compression
+
+    def open_archive(self):
+        self.archive = zipfile.ZipFile(self.file, "w", self.compression)
+
+    def add_member(self, name, data):
+        self.archive.writestr(name.replace(os.sep, "/"), data)
+
+    def close_archive(self):
+        self.archive.close()
+
+
+class TarSink(StreamSink):
+    def __init__(self, target, compression=""):
+        super().__init__(target)
+        self.compression = compression
+
+    def open_archive(self):
+        # stream mode never seeks, so the archive can go straight to stdout
+        self.archive = tarfile.open(fileobj=self.file, mode="w|" + self.compression)
+
+    def add_member(self, name, data):
+        info = tarfile.TarInfo(name.replace(os.sep, "/"))
+        info.size = len(data)
+        info.mtime = int(time.time())
+        self.archive.addfile(info, io.BytesIO(data))
+
+    def close_archive(self):
+        self.archive.close()
+
+
+class MemorySink:
+    output_dir = None
+
+    def __init__(self):
+        self.files = {}
+        self.done = []
+
+    def open(self):
+        return self
+
+    def write(self, name, data):
+        self.files[name] = bytes(data)
+        self.done.append(name)
+
+    def drain(self):
+        done, self.done = self.done, []
+        return done
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+    def abort(self):
+        pass
+
+    def getvalue(self, name):
+        return self.files[name]
+
+    def scoped(self, prefix):
+        return ScopedSink(self, prefix)
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ScopedSink:
+    # view of a shared archive or memory sink that places names under a folder; closing it
+    # leaves the parent open for the next source
+    output_dir = None
+
+    def __init__(self, sink, prefix):
+        self.sink = sink
+        self.prefix = prefix
+
+    def open(self):
+        return self
+
+    def write(self, name, data):
+        self.sink.write(f"{self.prefix}/{name}", data)
+
+    def drain(self):
+        return [name[len(self.prefix) + 1:] for name in self.sink.drain()]
+
+    def flush(self):
+        self.sink.flush()
+
+    def close(self):
+        pass
+
+    def abort(self):
+        pass
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class NonClosing(io.RawIOBase):
+    # lets the buffered writer flush into stdout or a caller's stream without closing it
+    def __init__(self, raw):
+        self.raw = raw
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        return self.raw.write(data)
+
+    def flush(self):
+        self.raw.flush()
+
+    def close(self):
+        pass
+
+
+def open_sink(target):
+    if target == "-":
+        return TarSink("-")
+    lower = str(target).lower()
+    if lower.endswith(".zip"):
+        return ZipSink(target)
+    if lower.endswith((".tar.gz", ".tgz")):
+        return TarSink(target, "gz")
+    if lower.endswith(".tar"):
+        return TarSink(target)
+    return DirectorySink(target)
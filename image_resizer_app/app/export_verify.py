@@ -0,0 +1,163 @@
+import os
+import sys
+import hashlib
+import zipfile
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from app.export_catalog import READ_CHUNK
+from app.export_journal import JOURNAL_NAME, TEMP_SUFFIX
+
+# "<blake2b-128 hex>  <name>" per line, the format `b2sum -l 128 -c` checks
+MANIFEST_NAME = "manifest.b2"
+# bookkeeping files an export leaves next to its tiles; never reported as extra
+SIDECAR_NAMES = (MANIFEST_NAME, JOURNAL_NAME)
+
+
+def stream_checksum(f):
+    digest = hashlib.blake2b(digest_size=16)
+    while chunk := f.read(READ_CHUNK):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def manifest_data(checksums):
+    # checksums: (name, hex digest) pairs, names relative to the manifest's folder
+    return "".join(f"{checksum}  {name.replace(os.sep, '/')}\n" for name, checksum in checksums).encode("utf-8")
+
+
+def parse_manifest(text):
+    checksums = {}
+    for line in text.splitlines():
+        checksum, sep, name = line.partition("  ")
+        if sep:
+            checksums[name] = checksum
+    return checksums
+
+
+class FolderTarget:
+    def __init__(self, path):
+        self.path = path
+
+    def names(self):
+        names = []
+        for folder, _, files in os.walk(self.path):
+            rel = os.path.relpath(folder, self.path)
+            for name in files:
+                names.append(name if rel == "." else f"{rel.replace(os.sep, '/')}/{name}")
+        return names
+
+    def read_text(self, name):
+        with open(os.path.join(self.path, name), "r", encoding="utf-8") as f:
+            return f.read()
+
+    def checksum(self, name):
+        with open(os.path.join(self.path, name), "rb") as f:
+            return stream_checksum(f)
+
+    def close(self):
+        pass
+
+
+class ZipTarget:
+    def __init__(self, path):
+        self.path = path
+        self.archive = zipfile.ZipFile(path)
+        # each hashing thread reads through its own handle
+        self.local = threading.local()
+        self.handles = []
+
+    def names(self):
+        return [info.filename for info in self.archive.infolist() if not info.is_dir()]
+
+    def read_text(self, name):
+        return self.archive.read(name).decode("utf-8")
+
+    def checksum(self, name):
+        if not hasattr(self.local, "archive"):
+            self.local.archive = zipfile.ZipFile(self.path)
+            self.handles.append(self.local.archive)
+        with self.local.archive.open(name) as f:
+            return stream_checksum(f)
+
+    def close(self):
+        for archive in [self.archive] + self.handles:
+            archive.close()
+
+
+def open_target(path):
+    if os.path.isdir(path):
+        return FolderTarget(path)
+    if zipfile.is_zipfile(path):
+        return ZipTarget(path)
+    raise ValueError(f"{path} is neither a folder nor a ZIP archive")
+
+
+def expected_checksums(target, names):
+    # every manifest covers its own folder, so multi-image and per-frame exports verify in one pass
+    expected = {}
+    for name in names:
+        folder, _, base = name.rpartition("/")
+        if base == MANIFEST_NAME:
+            for member, checksum in parse_manifest(target.read_text(name)).items():
+                expected[f"{folder}/{member}" if folder else member] = checksum
+    return expected
+
+
+def is_sidecar(name):
+    base = name.rpartition("/")[2]
+    return base in SIDECAR_NAMES or base.endswith(TEMP_SUFFIX)
+
+
+def verify_export(path, workers=None):
+    target = open_target(path)
+    try:
+        names = target.names()
+        expected = expected_checksums(target, names)
+        present = set(names)
+        report = {
+            "manifests": sum(1 for name in names if name.rpartition("/")[2] == MANIFEST_NAME),
+            "checked": 0,
+            "missing": sorted(name for name in expected if name not in present),
+            "corrupted": [],
+            "extra": sorted(name for name in present if name not in expected and not is_sidecar(name)),
+        }
+        todo = sorted(name for name in expected if name in present)
+
+        def check(name):
+            try:
+                return name, target.checksum(name)
+            except (OSError, zipfile.BadZipFile) as e:
+                # unreadable members, including ZIP CRC failures, count as corrupted
+                return name, f"error: {e}"
+
+        with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+            for name, checksum in pool.map(check, todo):
+                report["checked"] += 1
+                if checksum != expected[name]:
+                    report["corrupted"].append(name)
+        return report
+    finally:
+        target.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="verify", description="Check exported tiles against their checksum manifests.")
+    parser.add_argument("target", help="export folder or ZIP archive")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    report = verify_export(args.target, args.workers)
+    if not report["manifests"]:
+        print(f"No {MANIFEST_NAME} found in: {args.target}")
+        sys.exit(2)
+    for kind in ("missing", "corrupted", "extra"):
+        for name in report[kind]:
+            print(f"{kind.upper()}: {name}")
+    print(f"Checked {report['checked']} files: {len(report['missing'])} missing, "
+          f"{len(report['corrupted'])} corrupted, {len(report['extra'])} extra")
+    if report["missing"] or report["corrupted"] or report["extra"]:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+import os
+import hashlib
+from PIL import Image
+from PyQt6.QtWidgets import QListView
+from PyQt6.QtGui import QImage, QColor
+from PyQt6.QtCore import Qt, QSize, QRunnable, QThreadPool, QAbstractListModel, QModelIndex
+from app.crop_strip import ThumbnailSignals
+from app.export_journal import atomic_write
+from app.image_source import pil_to_qimage
+
+FILMSTRIP_THUMB_SIZE = 80
+THUMB_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "image_resizer", "thumbnails")
+
+
+def thumbnail_cache_path(path, cache_dir=THUMB_CACHE_DIR):
+    stat = os.stat(path)
+    key = f"{os.path.abspath(path)}|{stat.st_mtime_ns}|{stat.st_size}|{FILMSTRIP_THUMB_SIZE}"
+    return os.path.join(cache_dir, hashlib.blake2b(key.encode(), digest_size=16).hexdigest() + ".png")
+
+
+def cached_thumbnail(path, cache_dir=THUMB_CACHE_DIR):
+    cache_path = thumbnail_cache_path(path, cache_dir)
+    if os.path.exists(cache_path):
+        thumb = QImage(cache_path)
+        if not thumb.isNull():
+            return thumb
+    with Image.open(path) as image:
+        # JPEG draft mode decodes at a fraction of the size
+        image.draft("RGB", (FILMSTRIP_THUMB_SIZE, FILMSTRIP_THUMB_SIZE))
+        image.thumbnail((FILMSTRIP_THUMB_SIZE, FILMSTRIP_THUMB_SIZE))
+        os.makedirs(cache_dir, exist_ok=True)
+        atomic_write(cache_path, lambda f: image.save(f, format="PNG"))
+        qimage, _ = pil_to_qimage(image)
+        return qimage.copy()
+
+
+class FilmstripTask(QRunnable):
+    def __init__(self, path, signals):
+        super().__init__()
+        self.path = path
+        self.signals = signals
+
+    def run(self):
+        try:
+            thumb = cached_thumbnail(self.path)
+        except Exception:
+            thumb = QImage()
+        self.signals.done.emit(self.path, thumb)
+
+
+class FilmstripModel(QAbstractListModel):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.paths = []
+        self.thumbnails = {}
+        self.pending = set()
+        self.signals = ThumbnailSignals()
+        self.signals.done.connect(self.on_thumbnail)
+        self.pool = QThreadPool.globalInstance()
+        self.placeholder = QImage(FILMSTRIP_THUMB_SIZE, FILMSTRIP_THUMB_SIZE, QImage.Format.Format_RGB32)
+        self.placeholder.fill(QColor("#e0e0e0"))
+
+    def set_paths(self, paths):
+        self.beginResetModel()
+        self.paths = list(paths)
+        self.thumbnails = {p: t for p, t in self.thumbnails.items() if p in set(self.paths)}
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.paths)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        path = self.paths[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return os.path.basename(path)
+        if role == Qt.ItemDataRole.ToolTipRole:
+            return path
+        if role == Qt.ItemDataRole.DecorationRole:
+            # only visible rows are asked for, so thumbnails load lazily
+            thumb = self.thumbnails.get(path)
+            if thumb is None:
+                if path not in self.pending:
+                    self.pending.add(path)
+                    self.pool.start(FilmstripTask(path, self.signals))
+                return self.placeholder
+            return thumb if not thumb.isNull() else self.placeholder
+        return None
+
+    def on_thumbnail(self, path, thumb):
+        self.pending.discard(path)
+        if path not in self.paths:
+            return
+        self.thumbnails[path] = thumb
+        index = self.index(self.paths.index(path))
+        self.dataChanged.emit(index, index, [Qt.ItemDataRole.DecorationRole])
+
+
+class Filmstrip(QListView):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.thumbnails = FilmstripModel(self)
+        self.setModel(self.thumbnails)
+        self.setFlow(QListView.Flow.LeftToRight)
+        self.setWrapping(False)
+        self.setUniformItemSizes(True)
+        self.setIconSize(QSize(FILMSTRIP_THUMB_SIZE, FILMSTRIP_THUMB_SIZE))
+        self.setFixedHeight(FILMSTRIP_THUMB_SIZE + 44)
+        self.setStyleSheet("border: 1px solid gray;")
+
+    def set_paths(self, paths):
+        self.thumbnails.set_paths(paths)
+
+    def select_row(self, row):
+        index = self.thumbnails.index(row)
+        self.setCurrentIndex(index)
+        self.scrollTo(index)
@@ -0,0 +1,159 @@
+import os
+import argparse
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from PIL import Image
+from app.export_crops import (export_crops, generate_filename, plan_crops, crop_numbers, prepare_crop,
+                              parse_lines, resize_crop, written_entries)
+from app.export_journal import atomic_save
+from app.tile_filter import TileFilter
+from app.crop_stats import STATS_FORMATS
+
+INPUT_EXTENSIONS = (".jpg", ".jpeg", ".png", ".tif", ".tiff", ".gif", ".webp")
+ANIMATION_EXTENSIONS = (".gif", ".webp")
+
+
+def frame_count(path):
+    with Image.open(path) as image:
+        return getattr(image, "n_frames", 1)
+
+
+def parse_frames(text, count):
+    # "all", "5" or "2-10" (inclusive, 0-based) -> range of frame numbers
+    if not text or text == "all":
+        return range(count)
+    start, _, end = text.partition("-")
+    start = int(start)
+    end = int(end) if end else start
+    if not 0 <= start <= end < count:
+        raise ValueError(f"frame range {text} outside 0-{count - 1}")
+    return range(start, end + 1)
+
+
+def frame_image(image):
+    # palette frames are expanded so crops, resizes and encoders see real colours
+    if image.mode == "P":
+        return image.convert("RGBA")
+    return image.copy()
+
+
+def iter_frames(path, frames):
+    with Image.open(path) as image:
+        for frame in frames:
+            image.seek(frame)
+            yield frame, frame_image(image), image.info.get("duration")
+
+
+def frame_name(frame):
+    return f"frame-{frame:04d}"
+
+
+def frame_dir(output_dir, frame):
+    return os.path.join(output_dir, frame_name(frame))
+
+
+def export_frame_chunk(image_path, frames, vertical_lines, horizontal_lines, output_dir, prefix, suffix, ext,
+                       includes, resize_percent, boxes, resume, skip_blank=False, stats=None, sink=None):
+    # one worker walks a contiguous run of frames, so GIF/WebP deltas are decoded once
+    exported = 0
+    for frame, image, _ in iter_frames(image_path, frames):
+        tile_filter = TileFilter() if skip_blank else None
+        frame_sink = sink.scoped(frame_name(frame)) if sink else None
+        entries = export_crops(image_path, vertical_lines, horizontal_lines, frame_dir(output_dir, frame),
+                               f"{prefix}-f{frame:04d}", suffix, ext, includes=includes,
+                               resize_percent=resize_percent, resume=resume, image=image, boxes=boxes,
+                               tile_filter=tile_filter, sink=frame_sink, stats=stats)
+        exported += len(written_entries(entries))
+    return exported
+
+
+def chunks(frames, count):
+    size = max(-(-len(frames) // count), 1)
+    return [frames[i:i + size] for i in range(0, len(frames), size)]
+
+
+def export_frames(image_path, vertical_lines, horizontal_lines, output_dir, prefix="cropped", suffix="", ext=".jpg",
+                  includes=None, resize_percent=None, boxes=None, frames=None, workers=None, resume=False,
+                  skip_blank=False, stats=None, sink=None):
+    # sink: a shared archive sink (ZIP/tar); it cannot cross processes, so frames then run in one
+    frames = frames if frames is not None else range(frame_count(image_path))
+    workers = 1 if sink else min(workers or os.cpu_count() or 1, len(frames)) or 1
+    args = (vertical_lines, horizontal_lines, output_dir, prefix, suffix, ext, includes, resize_percent, boxes,
+            resume, skip_blank, stats)
+    if workers == 1:
+        return export_frame_chunk(image_path, frames, *args, sink=sink)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        jobs = [pool.submit(export_frame_chunk, image_path, chunk, *args) for chunk in chunks(frames, workers)]
+        return sum(job.result() for job in jobs)
+
+
+def save_animation(frames, durations, path, loop):
+    first, rest = frames[0], frames[1:]
+    params = {"save_all": True, "append_images": rest, "duration": durations, "loop": loop}
+    if path.lower().endswith(".gif"):
+        params["disposal"] = 2
+    atomic_save(first, path, **params)
+
+
+def export_animations(image_path, vertical_lines, horizontal_lines, output_dir, prefix="cropped", suffix="",
+                      ext=".gif", includes=None, resize_percent=None, boxes=None, frames=None, workers=None):
+    # every selected cell becomes its own animation over the selected frames
+    if ext.lower() not in ANIMATION_EXTENSIONS:
+        raise ValueError(f"animations can be written as {', '.join(ANIMATION_EXTENSIONS)}")
+    with Image.open(image_path) as image:
+        size = image.size
+        loop = image.info.get("loop", 0)
+        count = getattr(image, "n_frames", 1)
+    frames = frames if frames is not None else range(count)
+    boxes, includes = plan_crops(size, vertical_lines, horizontal_lines, boxes, includes)
+    numbers = crop_numbers(includes)
+
+    cells = {index: [] for index in numbers}
+    durations = []
+    for _, image, duration in iter_frames(image_path, frames):
+        durations.append(duration or 100)
+        for index in numbers:
+            cells[index].append(prepare_crop(resize_crop(image.crop(boxes[index]), resize_percent), ".png"))
+
+    os.makedirs(output_dir, exist_ok=True)
+
+    def write(index):
+        name = generate_filename(prefix, numbers[index], suffix, ext)
+        save_animation(cells[index], durations, os.path.join(output_dir, name), loop)
+        return name
+
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        return list(pool.map(write, numbers))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="frame_export", description="Slice every frame of a multi-page or animated image.")
+    parser.add_argument("image")
+    parser.add_argument("-o", "--output-dir", default="exports")
+    parser.add_argument("-x", "--vertical", type=parse_lines, default=[], help="comma separated x positions")
+    parser.add_argument("-y", "--horizontal", type=parse_lines, default=[], help="comma separated y positions")
+    parser.add_argument("--frames", default="all", help="all, N or START-END (0-based, inclusive)")
+    parser.add_argument("--prefix", default="cropped")
+    parser.add_argument("--suffix", default="")
+    parser.add_argument("--ext", default=None, help="defaults to .jpg, or .gif with --animate")
+    parser.add_argument("--resize", type=float, default=None, help="resize crops by percent")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--resume", action="store_true")
+    parser.add_argument("--skip-blank", action="store_true", help="do not write uniform or duplicate tiles")
+    parser.add_argument("--stats", choices=STATS_FORMATS, default=None, help="write per-tile stats in every frame folder")
+    parser.add_argument("--animate", action="store_true", help="write each cell as an animation instead of stills")
+    args = parser.parse_args(argv)
+
+    frames = parse_frames(args.frames, frame_count(args.image))
+    if args.animate:
+        names = export_animations(args.image, args.vertical, args.horizontal, args.output_dir, args.prefix,
+                                  args.suffix, args.ext or ".gif", resize_percent=args.resize, frames=frames,
+                                  workers=args.workers)
+        print(f"Exported {len(names)} animations to: {args.output_dir}")
+    else:
+        count = export_frames(args.image, args.vertical, args.horizontal, args.output_dir, args.prefix, args.suffix,
+                              args.ext or ".jpg", resize_percent=args.resize, frames=frames, workers=args.workers,
+                              resume=args.resume, skip_blank=args.skip_blank, stats=args.stats)
+        print(f"Exported {count} cropped images from {len(frames)} frames to: {args.output_dir}")
+
+if __name__ == "__main__":
+    main()
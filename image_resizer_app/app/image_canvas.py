@@ -1,8 +1,13 @@
 from PyQt6.QtWidgets import QLabel, QLineEdit, QPushButton, QWidget, QHBoxLayout
-from PyQt6.QtGui import QPixmap, QPainter, QColor, QPen, QMouseEvent, QFont
-from PyQt6.QtCore import Qt, QRect, QPoint
+from PyQt6.QtGui import QPixmap, QImage, QPainter, QColor, QPen, QMouseEvent, QFont
+from PyQt6.QtCore import Qt, QRect, QPoint, QSize, QTimer, QThreadPool
 import os
 import random
+from bisect import bisect_right
+from app.region_index import RegionIndex
+from app.cell_selection import CellSelection
+from app.frame_export import INPUT_EXTENSIONS
+from app.edge_snap import SNAP_RADIUS, EdgeIndexSignals, EdgeIndexTask
 
 class InlineEdit(QWidget):
     def __init__(self, axis, original, on_submit, parent=None):
@@ -43,8 +48,13 @@ class InlineEdit(QWidget):
         self.on_submit(value, self.axis, self.original)
         self.close()
 
+# distance from a guide, in display pixels, at which it can be grabbed and dragged
+GUIDE_GRAB = 3
+MIN_GUIDE_GAP = 24
+
 class ImageCanvas(QLabel):
-    def __init__(self, parent=None, on_image_loaded=None, on_error=None, on_guides_updated=None):
+    def __init__(self, parent=None, on_image_loaded=None, on_error=None, on_guides_updated=None,
+                 on_preview_changed=None):
         super().__init__(parent)
         self.setAcceptDrops(False)
         self.setAlignment(Qt.AlignmentFlag.AlignTop | Qt.AlignmentFlag.AlignLeft)
@@ -52,44 +62,110 @@ class ImageCanvas(QLabel):
         self.on_image_loaded = on_image_loaded
         self.on_error = on_error
         self.on_guides_updated = on_guides_updated
-        self.pixmap_loaded = None
+        self.on_preview_changed = on_preview_changed
+        self.source = None
+        self.preview_image = None
+        self.image_size = None
+        self.scaled_image = None
         self.scaled_pixmap = None
         self.vertical_lines = []
         self.horizontal_lines = []
-        self.grid_includes = []
+        self.selection = CellSelection()
         self.show_grid = False
         self.ruler_width = 30
         self.ruler_height = 30
         self.inline_editor = None
         self.delete_button_size = 14
         self.label_hitbox_size = 30
+        self.regions = RegionIndex()
+        self.region_mode = False
+        self.region_drag_start = None
+        self.region_drag_rect = None
+        self.hover_region = None
+        self.select_drag_start = None
+        self.select_drag_rect = None
+        self.guide_drag = None
+        self.guide_drag_pos = None
+        self.guide_drag_moved = False
+        # drag moves are applied at most once per display frame
+        self.drag_timer = QTimer(self)
+        self.drag_timer.setSingleShot(True)
+        self.drag_timer.timeout.connect(self.apply_guide_drag)
+        # edge index of the loaded image, built off the UI thread; None until it arrives
+        self.snap_edges = False
+        self.edge_index = None
+        self.edge_signals = EdgeIndexSignals()
+        self.edge_signals.done.connect(self.on_edge_index)
 
     def pixmap(self):
         return self.scaled_pixmap
 
     def is_valid_image(self, path):
-        return os.path.splitext(path)[1].lower() in [".jpg", ".jpeg", ".png"]
-
-    def load_image(self, file_path):
-        self.pixmap_loaded = QPixmap(file_path)
+        return os.path.splitext(path)[1].lower() in INPUT_EXTENSIONS
+
+    def load_image(self, source):
+        self.begin_loading(source.path, source.size, None)
+        self.finish_loading(source)
+
+    def begin_loading(self, path, size, preview_image):
+        # show a quick preview at the full image's display size so guides can be placed right away
+        self.source = None
+        self.edge_index = None
+        self.preview_image = preview_image
+        self.image_size = QSize(*size)
         self.update_scaled_pixmap()
         self.vertical_lines.clear()
         self.horizontal_lines.clear()
-        self.grid_includes.clear()
+        self.selection.reset(1, 1)
+        self.regions.clear()
+        self.hover_region = None
         if self.on_image_loaded:
-            self.on_image_loaded(file_path)
+            self.on_image_loaded(path)
+        self.update()
+
+    def finish_loading(self, source):
+        self.source = source
+        self.preview_image = None
+        QThreadPool.globalInstance().start(EdgeIndexTask(source, source.image, self.edge_signals))
+        self.update_scaled_pixmap()
         self.update()
 
+    def on_edge_index(self, source, index):
+        if source is self.source:
+            self.edge_index = index
+
+    def set_snap_edges(self, enabled):
+        self.snap_edges = enabled
+
+    def snap_guide(self, axis, value):
+        # value in display pixels; the index is looked up in image pixels
+        if not self.snap_edges or not self.edge_index:
+            return value
+        sx, sy = self.display_scale()
+        scale = sx if axis == "vertical" else sy
+        return int(round(self.edge_index.snap(axis, value / scale, SNAP_RADIUS / scale) * scale))
+
     def update_scaled_pixmap(self):
-        if self.pixmap_loaded:
-            available_width = self.width() - self.ruler_width
-            available_height = self.height() - self.ruler_height
-            self.scaled_pixmap = self.pixmap_loaded.scaled(
-                available_width,
-                available_height,
-                Qt.AspectRatioMode.KeepAspectRatio,
-                Qt.TransformationMode.SmoothTransformation
-            )
+        if not self.image_size:
+            return
+        available_width = self.width() - self.ruler_width
+        available_height = self.height() - self.ruler_height
+        target = self.image_size.scaled(available_width, available_height, Qt.AspectRatioMode.KeepAspectRatio)
+        if self.source:
+            image = self.source.qimage
+        elif self.preview_image:
+            image = self.preview_image
+        else:
+            image = QImage(target, QImage.Format.Format_RGB32)
+            image.fill(QColor("#d8d8d8"))
+        self.scaled_image = image.scaled(
+            target,
+            Qt.AspectRatioMode.IgnoreAspectRatio,
+            Qt.TransformationMode.SmoothTransformation
+        )
+        self.scaled_pixmap = QPixmap.fromImage(self.scaled_image)
+        if self.on_preview_changed:
+            self.on_preview_changed()
 
     def resizeEvent(self, event):
         self.update_scaled_pixmap()
@@ -102,7 +178,128 @@ class ImageCanvas(QLabel):
         return self.horizontal_lines
 
     def get_active_crop_flags(self):
-        return self.grid_includes
+        return self.cell_selection().flags()
+
+    def grid_shape(self):
+        return len(self.horizontal_lines) + 1, len(self.vertical_lines) + 1
+
+    def cell_selection(self):
+        self.selection.fit(*self.grid_shape())
+        return self.selection
+
+    def selection_changed(self):
+        if self.on_preview_changed:
+            self.on_preview_changed()
+        self.update()
+
+    def cell_at(self, pos):
+        # (row, col) of the grid cell under a widget position, clamped to the image
+        x = min(max(pos.x() - self.ruler_width, 0), self.scaled_pixmap.width() - 1)
+        y = min(max(pos.y() - self.ruler_height, 0), self.scaled_pixmap.height() - 1)
+        return bisect_right(sorted(self.horizontal_lines), y), bisect_right(sorted(self.vertical_lines), x)
+
+    def guide_lines(self, axis):
+        return self.vertical_lines if axis == "vertical" else self.horizontal_lines
+
+    def add_guide(self, axis, value):
+        lines = self.guide_lines(axis)
+        self.cell_selection().split(axis, sum(1 for l in lines if l < value))
+        lines.append(value)
+
+    def remove_guide(self, axis, value):
+        lines = self.guide_lines(axis)
+        self.cell_selection().merge(axis, sorted(lines).index(value))
+        lines.remove(value)
+
+    def preview_cells(self):
+        if not self.scaled_image:
+            return []
+        pw, ph = self.scaled_image.width(), self.scaled_image.height()
+        x_lines = [0] + sorted(min(x, pw) for x in self.vertical_lines) + [pw]
+        y_lines = [0] + sorted(min(y, ph) for y in self.horizontal_lines) + [ph]
+        cells = []
+        for i in range(len(x_lines) - 1):
+            for j in range(len(y_lines) - 1):
+                cells.append((x_lines[i], y_lines[j], x_lines[i + 1] - x_lines[i], y_lines[j + 1] - y_lines[j]))
+        return cells
+
+    def display_scale(self):
+        return (self.scaled_pixmap.width() / self.image_size.width(),
+                self.scaled_pixmap.height() / self.image_size.height())
+
+    def to_image_point(self, pos):
+        sx, sy = self.display_scale()
+        return (pos.x() - self.ruler_width) / sx, (pos.y() - self.ruler_height) / sy
+
+    def to_image_rect(self, rect):
+        sx, sy = self.display_scale()
+        return (int((rect.left() - self.ruler_width) / sx), int((rect.top() - self.ruler_height) / sy),
+                int((rect.right() + 1 - self.ruler_width) / sx) + 1, int((rect.bottom() + 1 - self.ruler_height) / sy) + 1)
+
+    def region_display_rect(self, rect):
+        sx, sy = self.display_scale()
+        x1, y1, x2, y2 = rect
+        left = self.ruler_width + int(x1 * sx)
+        top = self.ruler_height + int(y1 * sy)
+        return QRect(left, top, max(int(x2 * sx) - int(x1 * sx), 1), max(int(y2 * sy) - int(y1 * sy), 1))
+
+    def get_regions(self):
+        return self.regions.rects()
+
+    def add_regions(self, rects):
+        for rect in rects:
+            self.regions.add(rect)
+        if self.on_preview_changed:
+            self.on_preview_changed()
+        self.update()
+
+    def toggle_region_mode(self, enabled):
+        self.region_mode = enabled
+        self.setMouseTracking(enabled)
+        self.hover_region = None
+        self.update()
+
+    def preview_regions(self):
+        if not self.scaled_image or not len(self.regions):
+            return []
+        cells = []
+        for rect in self.regions.rects():
+            r = self.region_display_rect(rect)
+            cells.append((r.x() - self.ruler_width, r.y() - self.ruler_height, r.width(), r.height()))
+        return cells
+
+    def get_state(self):
+        return {
+            "vertical": list(self.vertical_lines),
+            "horizontal": list(self.horizontal_lines),
+            "includes": self.cell_selection().flags(),
+            "regions": self.regions.rects(),
+        }
+
+    def set_state(self, state):
+        self.vertical_lines[:] = state["vertical"]
+        self.horizontal_lines[:] = state["horizontal"]
+        self.selection.set_flags(state["includes"], *self.grid_shape())
+        self.regions.clear()
+        for rect in state["regions"]:
+            self.regions.add(rect)
+        if self.on_preview_changed:
+            self.on_preview_changed()
+        self.update()
+
+    def set_guides(self, vertical, horizontal):
+        self.vertical_lines.clear()
+        self.horizontal_lines.clear()
+        for x in sorted(vertical):
+            if self.is_line_valid(x, self.vertical_lines):
+                self.vertical_lines.append(x)
+        for y in sorted(horizontal):
+            if self.is_line_valid(y, self.horizontal_lines):
+                self.horizontal_lines.append(y)
+        self.selection.reset(*self.grid_shape())
+        if self.on_guides_updated:
+            self.on_guides_updated()
+        self.update()
 
     def toggle_grid(self, show):
         self.show_grid = show
@@ -158,18 +355,15 @@ class ImageCanvas(QLabel):
             pw, ph = self.scaled_pixmap.width(), self.scaled_pixmap.height()
             x_lines = [0] + sorted(self.vertical_lines) + [pw]
             y_lines = [0] + sorted(self.horizontal_lines) + [ph]
-            total = (len(x_lines) - 1) * (len(y_lines) - 1)
-            while len(self.grid_includes) < total:
-                self.grid_includes.append(True)
+            mask = self.cell_selection().mask
 
-            idx = 0
             for i in range(len(x_lines) - 1):
                 for j in range(len(y_lines) - 1):
                     x1 = x_lines[i] + self.ruler_width
                     x2 = x_lines[i + 1] + self.ruler_width
                     y1 = y_lines[j] + self.ruler_height
                     y2 = y_lines[j + 1] + self.ruler_height
-                    color = QColor(120, 120, 120, 100) if not self.grid_includes[idx] else QColor(50, 200, 100, 120)
+                    color = QColor(120, 120, 120, 100) if not mask[j, i] else QColor(50, 200, 100, 120)
                     painter.setBrush(color)
                     painter.drawRect(QRect(x1, y1, x2 - x1, y2 - y1))
 
@@ -177,10 +371,25 @@ class ImageCanvas(QLabel):
                     painter.setPen(QColor("black"))
                     painter.setBrush(QColor("white"))
                     painter.drawRect(box)
-                    if self.grid_includes[idx]:
+                    if mask[j, i]:
                         painter.drawLine(box.topLeft() + QPoint(3, 6), box.bottomRight() - QPoint(3, 3))
                         painter.drawLine(box.bottomLeft() + QPoint(3, -3), box.topRight() - QPoint(3, -6))
-                    idx += 1
+
+        if len(self.regions) and self.image_size:
+            # only regions touching the dirty rect are painted
+            for region_id in self.regions.intersecting(self.to_image_rect(event.rect())):
+                rect = self.region_display_rect(self.regions.regions[region_id])
+                painter.setPen(QPen(QColor("orange"), 2))
+                painter.setBrush(QColor(255, 165, 0, 90) if region_id == self.hover_region else Qt.BrushStyle.NoBrush)
+                painter.drawRect(rect)
+        if self.select_drag_rect:
+            painter.setPen(QPen(QColor(50, 200, 100), 1, Qt.PenStyle.DashLine))
+            painter.setBrush(Qt.BrushStyle.NoBrush)
+            painter.drawRect(self.select_drag_rect)
+        if self.region_drag_rect:
+            painter.setPen(QPen(QColor("orange"), 1, Qt.PenStyle.DashLine))
+            painter.setBrush(Qt.BrushStyle.NoBrush)
+            painter.drawRect(self.region_drag_rect)
 
     def draw_delete_button(self, painter, x, y):
         rect = QRect(x, y, self.delete_button_size, self.delete_button_size)
@@ -194,25 +403,35 @@ class ImageCanvas(QLabel):
         pos = event.position().toPoint()
         if not self.scaled_pixmap:
             return
+        if self.region_mode and pos.x() >= self.ruler_width and pos.y() >= self.ruler_height:
+            if event.button() == Qt.MouseButton.RightButton:
+                hits = self.regions.at(*self.to_image_point(pos))
+                if hits:
+                    self.update(self.region_display_rect(self.regions.regions[hits[0]]).adjusted(-2, -2, 2, 2))
+                    self.regions.remove(hits[0])
+                    self.hover_region = None
+                    if self.on_preview_changed:
+                        self.on_preview_changed()
+            else:
+                self.region_drag_start = pos
+            return
         pw, ph = self.scaled_pixmap.width(), self.scaled_pixmap.height()
         x_lines = [0] + sorted(self.vertical_lines) + [pw]
         y_lines = [0] + sorted(self.horizontal_lines) + [ph]
-        idx = 0
         for i in range(len(x_lines) - 1):
             for j in range(len(y_lines) - 1):
                 x2 = x_lines[i + 1] + self.ruler_width
                 y2 = y_lines[j + 1] + self.ruler_height
                 box = QRect(x2 - 16, y2 - 16, 12, 12)
                 if box.contains(pos):
-                    self.grid_includes[idx] = not self.grid_includes[idx]
-                    self.update()
+                    self.cell_selection().toggle(j, i)
+                    self.selection_changed()
                     return
-                idx += 1
 
         for vx in self.vertical_lines:
             px = vx + self.ruler_width
             if QRect(px - 7, self.ruler_height, 14, 14).contains(pos):
-                self.vertical_lines.remove(vx)
+                self.remove_guide("vertical", vx)
                 if self.on_guides_updated:
                     self.on_guides_updated()
                 self.update()
@@ -223,7 +442,7 @@ class ImageCanvas(QLabel):
         for hy in self.horizontal_lines:
             py = hy + self.ruler_height
             if QRect(self.ruler_width, py - 7, 14, 14).contains(pos):
-                self.horizontal_lines.remove(hy)
+                self.remove_guide("horizontal", hy)
                 if self.on_guides_updated:
                     self.on_guides_updated()
                 self.update()
@@ -232,20 +451,143 @@ class ImageCanvas(QLabel):
                 self.show_inline_editor(hy, "horizontal")
                 return
 
+        grabbed = self.guide_at(pos)
+        if grabbed:
+            self.guide_drag = grabbed
+            self.guide_drag_moved = False
+            self.setCursor(Qt.CursorShape.SizeHorCursor if grabbed[0] == "vertical" else Qt.CursorShape.SizeVerCursor)
+            return
+
+        if self.show_grid and pos.x() >= self.ruler_width and pos.y() >= self.ruler_height:
+            # dragging over the preview grid sets every covered cell to the opposite of the first one
+            self.select_drag_start = pos
+            return
+
         if pos.y() < self.ruler_height:
-            x = pos.x() - self.ruler_width
+            x = self.snap_guide("vertical", pos.x() - self.ruler_width)
             if self.is_line_valid(x, self.vertical_lines):
-                self.vertical_lines.append(x)
+                self.add_guide("vertical", x)
                 if self.on_guides_updated:
                     self.on_guides_updated()
         elif pos.x() < self.ruler_width:
-            y = pos.y() - self.ruler_height
+            y = self.snap_guide("horizontal", pos.y() - self.ruler_height)
             if self.is_line_valid(y, self.horizontal_lines):
-                self.horizontal_lines.append(y)
+                self.add_guide("horizontal", y)
                 if self.on_guides_updated:
                     self.on_guides_updated()
         self.update()
 
+    def guide_at(self, pos):
+        if pos.x() >= self.ruler_width and pos.y() >= self.ruler_height:
+            for i, vx in enumerate(self.vertical_lines):
+                if abs(pos.x() - self.ruler_width - vx) <= GUIDE_GRAB:
+                    return "vertical", i
+            for i, hy in enumerate(self.horizontal_lines):
+                if abs(pos.y() - self.ruler_height - hy) <= GUIDE_GRAB:
+                    return "horizontal", i
+        return None
+
+    def guide_strip(self, axis, value):
+        # area painted for one guide: the line, its delete button and its label
+        if axis == "vertical":
+            return QRect(value + self.ruler_width - 8, 0, 48, self.height())
+        return QRect(0, value + self.ruler_height - 14, self.width(), 24)
+
+    def apply_guide_drag(self):
+        if not self.guide_drag or self.guide_drag_pos is None:
+            return
+        axis, idx = self.guide_drag
+        lines = self.vertical_lines if axis == "vertical" else self.horizontal_lines
+        if axis == "vertical":
+            value, limit = self.guide_drag_pos.x() - self.ruler_width, self.scaled_pixmap.width()
+        else:
+            value, limit = self.guide_drag_pos.y() - self.ruler_height, self.scaled_pixmap.height()
+        value = self.snap_guide(axis, value)
+        # a guide never passes its neighbours, so grid cell order and include flags stay put
+        lower = max((l + MIN_GUIDE_GAP for l in lines if l < lines[idx]), default=1)
+        upper = min((l - MIN_GUIDE_GAP for l in lines if l > lines[idx]), default=limit - 1)
+        value = min(max(value, lower), upper)
+        old = lines[idx]
+        if value == old or lower > upper:
+            return
+        lines[idx] = value
+        self.guide_drag_moved = True
+        old_strip, new_strip = self.guide_strip(axis, old), self.guide_strip(axis, value)
+        if self.show_grid:
+            # cell fills between the two positions change colour as well
+            self.update(old_strip.united(new_strip))
+        else:
+            self.update(old_strip)
+            self.update(new_strip)
+
+    def frame_interval(self):
+        rate = self.screen().refreshRate() if self.screen() else 0
+        return int(1000 / rate) if rate > 0 else 16
+
+    def mouseMoveEvent(self, event: QMouseEvent):
+        pos = event.position().toPoint()
+        if self.guide_drag:
+            self.guide_drag_pos = pos
+            if not self.drag_timer.isActive():
+                self.drag_timer.start(self.frame_interval())
+            return
+        if self.select_drag_start:
+            old = self.select_drag_rect
+            self.select_drag_rect = QRect(self.select_drag_start, pos).normalized()
+            dirty = self.select_drag_rect.united(old) if old else self.select_drag_rect
+            self.update(dirty.adjusted(-2, -2, 2, 2))
+            return
+        if not self.scaled_pixmap or not self.region_mode:
+            return
+        if self.region_drag_start:
+            old = self.region_drag_rect
+            self.region_drag_rect = QRect(self.region_drag_start, pos).normalized()
+            dirty = self.region_drag_rect.united(old) if old else self.region_drag_rect
+            self.update(dirty.adjusted(-2, -2, 2, 2))
+            return
+        hits = self.regions.at(*self.to_image_point(pos))
+        hover = hits[0] if hits else None
+        if hover != self.hover_region:
+            for region_id in (self.hover_region, hover):
+                if region_id in self.regions.regions:
+                    self.update(self.region_display_rect(self.regions.regions[region_id]).adjusted(-2, -2, 2, 2))
+            self.hover_region = hover
+
+    def mouseReleaseEvent(self, event: QMouseEvent):
+        if self.guide_drag:
+            self.drag_timer.stop()
+            self.apply_guide_drag()
+            moved = self.guide_drag_moved
+            self.guide_drag = None
+            self.guide_drag_pos = None
+            self.unsetCursor()
+            if moved and self.on_guides_updated:
+                self.on_guides_updated()
+            return
+        if self.select_drag_start:
+            start, end = self.select_drag_start, event.position().toPoint()
+            self.select_drag_start = None
+            self.select_drag_rect = None
+            selection = self.cell_selection()
+            row, col = self.cell_at(start)
+            selection.select_rect(row, col, *self.cell_at(end), value=not selection.is_selected(row, col))
+            self.selection_changed()
+            return
+        if not self.region_drag_start:
+            return
+        rect = self.region_drag_rect
+        self.region_drag_start = None
+        self.region_drag_rect = None
+        if rect:
+            self.update(rect.adjusted(-2, -2, 2, 2))
+        if not rect or rect.width() < 4 or rect.height() < 4:
+            return
+        x1, y1, x2, y2 = self.to_image_rect(rect)
+        w, h = self.image_size.width(), self.image_size.height()
+        self.regions.add((max(x1, 0), max(y1, 0), min(x2, w), min(y2, h)))
+        if self.on_preview_changed:
+            self.on_preview_changed()
+
     def show_inline_editor(self, original_value, axis):
         if self.inline_editor:
             self.inline_editor.setParent(None)
@@ -263,8 +605,14 @@ class ImageCanvas(QLabel):
         if original_value not in lines:
             return
         idx = lines.index(original_value)
-        if all(abs(new_value - other) >= 24 for i, other in enumerate(lines) if i != idx):
-            lines[idx] = new_value
+        others = [other for i, other in enumerate(lines) if i != idx]
+        if all(abs(new_value - other) >= 24 for other in others):
+            if sum(1 for l in others if l < new_value) == sum(1 for l in others if l < original_value):
+                lines[idx] = new_value
+            else:
+                # the guide jumped past others: its old seam closes and a new one opens
+                self.remove_guide(axis, original_value)
+                self.add_guide(axis, new_value)
             if self.on_error: self.on_error("")
             if self.on_guides_updated: self.on_guides_updated()
         else:
@@ -273,12 +621,18 @@ class ImageCanvas(QLabel):
         self.update()
 
     def clear_canvas(self):
-        self.pixmap_loaded = None
+        self.source = None
+        self.edge_index = None
+        self.preview_image = None
+        self.image_size = None
+        self.scaled_image = None
         self.scaled_pixmap = None
         self.setPixmap(QPixmap())
         self.vertical_lines.clear()
         self.horizontal_lines.clear()
-        self.grid_includes.clear()
+        self.selection.reset(1, 1)
+        self.regions.clear()
+        self.hover_region = None
         self.update()
         if self.on_image_loaded:
             self.on_image_loaded(None)
\ No newline at end of file
@@ -0,0 +1,71 @@
+from PyQt6.QtCore import QObject, pyqtSignal
+from app.image_source import ImageLoader
+
+# images kept decoded on each side of the current one
+PREFETCH_RADIUS = 1
+
+
+class ImageSession(QObject):
+    source_ready = pyqtSignal(object)
+    load_progress = pyqtSignal(str, int)
+    load_failed = pyqtSignal(str, str)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.paths = []
+        self.index = -1
+        self.states = {}
+        self.sources = {}
+        self.loaders = {}
+
+    def set_paths(self, paths):
+        self.paths = list(paths)
+        self.index = -1
+        self.states.clear()
+        self.sources.clear()
+
+    def current_path(self):
+        if 0 <= self.index < len(self.paths):
+            return self.paths[self.index]
+        return None
+
+    def window(self):
+        lo = max(self.index - PREFETCH_RADIUS, 0)
+        return self.paths[lo:self.index + PREFETCH_RADIUS + 1]
+
+    def select(self, index):
+        self.index = index
+        wanted = self.window()
+        for path in list(self.sources):
+            if path not in wanted:
+                del self.sources[path]
+        # current image first so it gets a thread before the neighbours
+        self.request(self.paths[index])
+        for path in wanted:
+            self.request(path)
+        return self.paths[index]
+
+    def request(self, path):
+        if path in self.sources or path in self.loaders:
+            return
+        loader = ImageLoader(path, self)
+        loader.progress.connect(self.load_progress)
+        loader.loaded.connect(self.on_loaded)
+        loader.failed.connect(self.load_failed)
+        loader.finished.connect(lambda: self.loaders.pop(path, None))
+        self.loaders[path] = loader
+        loader.start()
+
+    def on_loaded(self, source):
+        if source.path in self.window():
+            self.sources[source.path] = source
+        self.source_ready.emit(source)
+
+    def source(self, path):
+        return self.sources.get(path)
+
+    def save_state(self, path, state):
+        self.states[path] = state
+
+    def state(self, path):
+        return self.states.get(path)
@@ -0,0 +1,128 @@
+import io
+import os
+from PIL import Image, ExifTags
+from PyQt6.QtGui import QImage, QImageReader
+from PyQt6.QtCore import QThread, QBuffer, QByteArray, pyqtSignal
+
+# QImage formats whose memory layout Pillow can map without copying
+PIL_MODES = {
+    QImage.Format.Format_RGBA8888: "RGBA",
+    QImage.Format.Format_RGBX8888: "RGBX",
+    QImage.Format.Format_Grayscale8: "L",
+}
+PREVIEW_SIDE = 640
+READ_CHUNK = 1 << 20
+
+
+def normalize_qimage(qimage):
+    if qimage.format() in PIL_MODES:
+        return qimage
+    # 32-bit Qt formats are converted in place, so this does not add a copy
+    if qimage.hasAlphaChannel():
+        qimage.convertTo(QImage.Format.Format_RGBA8888)
+    else:
+        qimage.convertTo(QImage.Format.Format_RGBX8888)
+    return qimage
+
+
+def pil_to_qimage(image):
+    if image.mode not in ("RGBA", "RGBX", "L"):
+        has_alpha = image.mode in ("LA", "PA", "RGBa") or "transparency" in image.info
+        image = image.convert("RGBA" if has_alpha else "RGBX")
+    data = image.tobytes()
+    fmt = {mode: fmt for fmt, mode in PIL_MODES.items()}[image.mode]
+    bytes_per_line = len(data) // image.height
+    return QImage(data, image.width, image.height, bytes_per_line, fmt), data
+
+
+def qimage_to_pil(qimage):
+    ptr = qimage.constBits()
+    ptr.setsize(qimage.sizeInBytes())
+    mode = PIL_MODES[qimage.format()]
+    return Image.frombuffer(mode, (qimage.width(), qimage.height()), ptr, "raw", mode, qimage.bytesPerLine(), 1)
+
+
+def decode(path, encoded=None):
+    if encoded is None:
+        reader = QImageReader(path)
+    else:
+        buffer = QBuffer(encoded)
+        reader = QImageReader(buffer)
+    qimage = reader.read()
+    if not qimage.isNull():
+        return normalize_qimage(qimage), None
+    # formats without a Qt image plugin go through Pillow once
+    with Image.open(path if encoded is None else io.BytesIO(encoded.data())) as image:
+        return pil_to_qimage(image)
+
+
+def exif_thumbnail(image):
+    exif_data = image.info.get("exif")
+    if not exif_data:
+        return None
+    ifd1 = image.getexif().get_ifd(ExifTags.IFD.IFD1)
+    offset = ifd1.get(ExifTags.Base.JpegIFOffset)
+    length = ifd1.get(ExifTags.Base.JpegIFByteCount)
+    if not offset or not length:
+        return None
+    if exif_data.startswith(b"Exif\x00\x00"):
+        exif_data = exif_data[6:]
+    try:
+        thumb = Image.open(io.BytesIO(exif_data[offset:offset + length]))
+        thumb.load()
+    except Exception:
+        return None
+    return thumb
+
+
+def read_preview(path, max_side=PREVIEW_SIDE):
+    # full image size plus a small QImage (or None), without a full decode
+    with Image.open(path) as image:
+        size = image.size
+        thumb = exif_thumbnail(image)
+        if thumb is None and image.format == "JPEG":
+            image.draft("RGB", (max_side, max_side))
+            thumb = image
+        if thumb is None:
+            return size, None
+        thumb.thumbnail((max_side, max_side))
+        qimage, _ = pil_to_qimage(thumb)
+        return size, qimage.copy()
+
+
+class ImageLoader(QThread):
+    progress = pyqtSignal(str, int)
+    loaded = pyqtSignal(object)
+    failed = pyqtSignal(str, str)
+
+    def __init__(self, path, parent=None):
+        super().__init__(parent)
+        self.path = path
+
+    def run(self):
+        try:
+            total = max(os.path.getsize(self.path), 1)
+            encoded = QByteArray()
+            with open(self.path, "rb") as f:
+                while chunk := f.read(READ_CHUNK):
+                    encoded.append(chunk)
+                    self.progress.emit(self.path, int(encoded.size() * 90 / total))
+            source = ImageSource(self.path, encoded)
+        except Exception as e:
+            self.failed.emit(self.path, str(e))
+            return
+        self.progress.emit(self.path, 100)
+        self.loaded.emit(source)
+
+
+class ImageSource:
+    def __init__(self, path, encoded=None):
+        self.path = path
+        # self.data keeps the buffer alive when the QImage wraps Pillow bytes
+        self.qimage, self.data = decode(path, encoded)
+        # zero-copy Pillow view of the QImage pixels, used by export
+        self.image = qimage_to_pil(self.qimage)
+
+    @property
+    def size(self):
+        return self.image.size
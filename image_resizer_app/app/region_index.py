@@ -0,0 +1,61 @@
+BUCKET_SIZE = 256
+
+
+class RegionIndex:
+    def __init__(self, bucket_size=BUCKET_SIZE):
+        self.bucket_size = bucket_size
+        self.regions = {}
+        self.buckets = {}
+        self.next_id = 1
+
+    def __len__(self):
+        return len(self.regions)
+
+    def __iter__(self):
+        return iter(sorted(self.regions.items()))
+
+    def bucket_range(self, rect):
+        x1, y1, x2, y2 = rect
+        size = self.bucket_size
+        for bx in range(x1 // size, (max(x2, x1 + 1) - 1) // size + 1):
+            for by in range(y1 // size, (max(y2, y1 + 1) - 1) // size + 1):
+                yield bx, by
+
+    def add(self, rect):
+        region_id = self.next_id
+        self.next_id += 1
+        rect = tuple(int(v) for v in rect)
+        self.regions[region_id] = rect
+        for key in self.bucket_range(rect):
+            self.buckets.setdefault(key, set()).add(region_id)
+        return region_id
+
+    def remove(self, region_id):
+        rect = self.regions.pop(region_id)
+        for key in self.bucket_range(rect):
+            bucket = self.buckets[key]
+            bucket.discard(region_id)
+            if not bucket:
+                del self.buckets[key]
+
+    def clear(self):
+        self.regions.clear()
+        self.buckets.clear()
+
+    def rects(self):
+        return [rect for _, rect in self]
+
+    def at(self, x, y):
+        # ids of regions containing the point, topmost (most recently added) first
+        bucket = self.buckets.get((int(x) // self.bucket_size, int(y) // self.bucket_size), ())
+        hits = [i for i in bucket if self.regions[i][0] <= x < self.regions[i][2] and self.regions[i][1] <= y < self.regions[i][3]]
+        return sorted(hits, reverse=True)
+
+    def intersecting(self, rect):
+        x1, y1, x2, y2 = rect
+        candidates = set()
+        for key in self.bucket_range(rect):
+            candidates |= self.buckets.get(key, set())
+        return sorted(i for i in candidates
+                      if self.regions[i][0] < x2 and x1 < self.regions[i][2]
+                      and self.regions[i][1] < y2 and y1 < self.regions[i][3])
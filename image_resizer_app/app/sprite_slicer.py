@@ -0,0 +1,117 @@
+import numpy as np
+
+DEFAULT_THRESHOLD = 16
+DEFAULT_MERGE_DISTANCE = 2
+DEFAULT_MIN_SIZE = 4
+
+
+def foreground_mask(image, threshold=DEFAULT_THRESHOLD):
+    if "A" in image.getbands():
+        alpha = np.asarray(image.getchannel("A"))
+        # an opaque alpha band says nothing about layout; fall back to background distance
+        if alpha.size and alpha.min() < 255:
+            return alpha > threshold
+    pixels = np.asarray(image.convert("RGB"), dtype=np.int16)
+    border = np.concatenate([pixels[0], pixels[-1], pixels[:, 0], pixels[:, -1]])
+    background = np.median(border, axis=0)
+    return (np.abs(pixels - background) > threshold).any(axis=2)
+
+
+def row_runs(mask):
+    # horizontal runs of foreground pixels as (row, start, end) with an exclusive end
+    height, width = mask.shape
+    padded = np.zeros((height, width + 2), dtype=np.int8)
+    padded[:, 1:-1] = mask
+    edges = np.diff(padded.ravel())
+    starts = np.flatnonzero(edges == 1) + 1
+    ends = np.flatnonzero(edges == -1) + 1
+    stride = width + 2
+    return starts // stride, starts % stride - 1, ends % stride - 1, stride
+
+
+def connect_runs(rows, starts, ends, stride):
+    # pairs of 8-connected runs in consecutive rows, found with two searchsorted passes
+    start_keys = rows * stride + starts
+    end_keys = rows * stride + ends
+    prev = (rows - 1) * stride
+    lo = np.searchsorted(end_keys, prev + starts, side="left")
+    hi = np.searchsorted(start_keys, prev + ends, side="right")
+    return expand_ranges(lo, hi)
+
+
+def union_labels(count, a, b):
+    labels = np.arange(count)
+    while True:
+        low = np.minimum(labels[a], labels[b])
+        updated = labels.copy()
+        np.minimum.at(updated, a, low)
+        np.minimum.at(updated, b, low)
+        # pointer jumping keeps the number of passes logarithmic
+        while True:
+            jumped = updated[updated]
+            if np.array_equal(jumped, updated):
+                break
+            updated = jumped
+        if np.array_equal(updated, labels):
+            return labels
+        labels = updated
+
+
+def component_boxes(mask):
+    rows, starts, ends, stride = row_runs(mask)
+    if len(rows) == 0:
+        return np.empty((0, 4), dtype=np.int64)
+    a, b = connect_runs(rows, starts, ends, stride)
+    _, labels = np.unique(union_labels(len(rows), a, b), return_inverse=True)
+    return reduce_boxes(labels, np.stack([starts, rows, ends, rows + 1], axis=1))
+
+
+def expand_ranges(lo, hi):
+    counts = np.maximum(hi - lo, 0)
+    owners = np.repeat(np.arange(len(lo)), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    return owners, np.repeat(lo, counts) + offsets
+
+
+def reduce_boxes(labels, boxes):
+    reduced = np.empty((labels.max() + 1, 4), dtype=np.int64)
+    reduced[:, :2] = np.iinfo(np.int64).max
+    reduced[:, 2:] = -1
+    np.minimum.at(reduced[:, 0], labels, boxes[:, 0])
+    np.minimum.at(reduced[:, 1], labels, boxes[:, 1])
+    np.maximum.at(reduced[:, 2], labels, boxes[:, 2])
+    np.maximum.at(reduced[:, 3], labels, boxes[:, 3])
+    return reduced
+
+
+def near_pairs(boxes, distance):
+    # sweep along x: only boxes starting before this one's right edge (+distance) can touch it
+    order = np.argsort(boxes[:, 0], kind="stable")
+    ordered = boxes[order]
+    lo = np.arange(1, len(ordered) + 1)
+    hi = np.searchsorted(ordered[:, 0], ordered[:, 2] + distance, side="left")
+    i, j = expand_ranges(lo, hi)
+    keep = (ordered[j, 1] < ordered[i, 3] + distance) & (ordered[i, 1] < ordered[j, 3] + distance)
+    return order[i[keep]], order[j[keep]]
+
+
+def merge_boxes(boxes, distance=DEFAULT_MERGE_DISTANCE):
+    while len(boxes) > 1:
+        a, b = near_pairs(boxes, distance)
+        if len(a) == 0:
+            break
+        _, labels = np.unique(union_labels(len(boxes), a, b), return_inverse=True)
+        boxes = reduce_boxes(labels, boxes)
+    return boxes
+
+
+def detect_sprites(image, threshold=DEFAULT_THRESHOLD, merge_distance=DEFAULT_MERGE_DISTANCE,
+                   min_size=DEFAULT_MIN_SIZE):
+    boxes = component_boxes(foreground_mask(image, threshold))
+    if merge_distance > 0:
+        boxes = merge_boxes(boxes, merge_distance)
+    keep = ((boxes[:, 2] - boxes[:, 0]) >= min_size) & ((boxes[:, 3] - boxes[:, 1]) >= min_size)
+    boxes = boxes[keep]
+    # reading order: top to bottom, then left to right
+    boxes = boxes[np.lexsort((boxes[:, 0], boxes[:, 1]))]
+    return [tuple(int(v) for v in box) for box in boxes]
@@ -0,0 +1,102 @@
+import hashlib
+import numpy as np
+from PIL import Image
+
+# largest per-channel spread (max - min) that still counts as a uniform tile
+BLANK_TOLERANCE = 8
+# alpha at or below this is treated as fully transparent
+ALPHA_THRESHOLD = 0
+HASH_SIDE = 8
+DEDUPE_MODES = ("exact", "perceptual")
+
+
+def tile_stats(crop):
+    pixels = np.asarray(crop)
+    if pixels.ndim == 2:
+        pixels = pixels[:, :, None]
+    bands = crop.getbands()
+    color = pixels[:, :, [i for i, band in enumerate(bands) if band not in ("A", "X")]]
+    spread = 0
+    if "A" in bands:
+        alpha = pixels[:, :, bands.index("A")]
+        opaque = alpha > ALPHA_THRESHOLD
+        coverage = float(opaque.mean()) if opaque.size else 0.0
+        if alpha.size:
+            spread = int(alpha.max()) - int(alpha.min())
+        # transparent pixels may carry arbitrary colour; only visible ones count
+        color = color[opaque]
+    else:
+        coverage = 1.0
+        color = color.reshape(-1, color.shape[-1])
+    variance = 0.0
+    if color.size:
+        spread = max(spread, int((color.max(axis=0).astype(np.int16) - color.min(axis=0)).max()))
+        variance = float(color.var(axis=0).max())
+    return {"variance": variance, "spread": spread, "alpha_coverage": coverage}
+
+
+def is_blank(stats, tolerance=BLANK_TOLERANCE):
+    return stats["alpha_coverage"] == 0 or stats["spread"] <= tolerance
+
+
+def blank_cells(image, x_lines, y_lines, tolerance=BLANK_TOLERANCE):
+    # is_blank for every cell of a grid at once, as a [row, col] array; per-cell max/min come
+    # from reduceat over the whole image instead of one crop per cell
+    bands = [band for band in image.getbands() if band != "X"]
+    pixels = np.asarray(image)
+    if pixels.ndim == 2:
+        pixels = pixels[:, :, None]
+    pixels = pixels[:, :, [i for i, band in enumerate(image.getbands()) if band != "X"]]
+    if "A" in bands:
+        # zeroing invisible pixels makes fully transparent cells uniform, while cells mixing
+        # transparent and visible pixels already differ in alpha
+        pixels = np.where(pixels[:, :, [bands.index("A")]] > ALPHA_THRESHOLD, pixels, 0)
+    height, width = pixels.shape[:2]
+    ys = np.clip(np.asarray(y_lines[:-1], dtype=np.intp), 0, height - 1)
+    xs = np.clip(np.asarray(x_lines[:-1], dtype=np.intp), 0, width - 1)
+    high = np.maximum.reduceat(np.maximum.reduceat(pixels, ys, axis=0), xs, axis=1)
+    low = np.minimum.reduceat(np.minimum.reduceat(pixels, ys, axis=0), xs, axis=1)
+    return (high.astype(np.int16) - low).max(axis=2) <= tolerance
+
+
+def exact_hash(crop):
+    digest = hashlib.blake2b(f"{crop.mode}|{crop.size}".encode(), digest_size=16)
+    digest.update(crop.tobytes())
+    return digest.hexdigest()
+
+
+def perceptual_hash(crop):
+    # difference hash of a tiny greyscale view: neighbouring pixel gradients as 64 bits
+    small = np.asarray(crop.convert("L").resize((HASH_SIDE + 1, HASH_SIDE), Image.Resampling.BOX), dtype=np.int16)
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return f"{crop.size[0]}x{crop.size[1]}:" + np.packbits(bits).tobytes().hex()
+
+
+class TileFilter:
+    def __init__(self, skip_blank=True, dedupe="exact", tolerance=BLANK_TOLERANCE):
+        if dedupe not in (None,) + DEDUPE_MODES:
+            raise ValueError(f"unknown dedupe mode: {dedupe}")
+        self.skip_blank = skip_blank
+        self.dedupe = dedupe
+        self.tolerance = tolerance
+        self.seen = {}
+
+    def key(self, crop):
+        if self.dedupe == "exact":
+            return exact_hash(crop)
+        if self.dedupe == "perceptual":
+            return perceptual_hash(crop)
+        return None
+
+    def check(self, crop):
+        # (reason, name of the tile already written, hash key) for a crop about to be encoded
+        if self.skip_blank and is_blank(tile_stats(crop), self.tolerance):
+            return "blank", None, None
+        key = self.key(crop)
+        if key is not None and key in self.seen:
+            return "duplicate", self.seen[key], key
+        return None, None, key
+
+    def remember(self, key, name):
+        if key is not None:
+            self.seen.setdefault(key, name)
@@ -0,0 +1,135 @@
+import os
+import math
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+from app.export_crops import prepare_crop
+from app.export_journal import atomic_write, encode_image
+
+DZI_TILE_SIZE = 254
+DZI_OVERLAP = 1
+XYZ_TILE_SIZE = 256
+LAYOUTS = ("dzi", "xyz")
+
+
+def level_count(size):
+    # DZI levels run from a 1x1 image (level 0) up to full resolution
+    return int(math.ceil(math.log2(max(size)))) + 1 if max(size) > 1 else 1
+
+
+def tile_boxes(size, tile_size, overlap=0):
+    width, height = size
+    for col in range(int(math.ceil(width / tile_size))):
+        for row in range(int(math.ceil(height / tile_size))):
+            x, y = col * tile_size, row * tile_size
+            yield col, row, (max(x - overlap, 0), max(y - overlap, 0),
+                             min(x + tile_size + overlap, width), min(y + tile_size + overlap, height))
+
+
+def dzi_descriptor(size, tile_size, overlap, ext):
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        f'<Image xmlns="http://schemas.microsoft.com/deepzoom/2008" Format="{ext.lstrip(".")}" '
+        f'Overlap="{overlap}" TileSize="{tile_size}">\n'
+        f'  <Size Width="{size[0]}" Height="{size[1]}"/>\n'
+        '</Image>\n'
+    )
+
+
+def pad_tile(tile, tile_size, ext):
+    # XYZ viewers assume square tiles, so edge tiles are filled out to tile_size the way
+    # gdal2tiles does: transparent, or white where the format has no alpha
+    if tile.size == (tile_size, tile_size):
+        return tile
+    if ext.lower() in (".jpg", ".jpeg"):
+        padded = Image.new("RGB", (tile_size, tile_size), "white")
+        tile = tile.convert("RGB")
+    else:
+        padded = Image.new("RGBA", (tile_size, tile_size), (0, 0, 0, 0))
+        tile = tile.convert("RGBA")
+    padded.paste(tile, (0, 0))
+    return padded
+
+
+def write_tile(level_image, box, path, ext, pad_to=None):
+    # tiles are plain writes; the descriptor is written atomically last and marks the pyramid complete
+    tile = level_image.crop(box)
+    if pad_to:
+        tile = pad_tile(tile, pad_to, ext)
+    data = encode_image(prepare_crop(tile, ext), path)
+    with open(path, "wb") as f:
+        f.write(data)
+    return len(data)
+
+
+def export_pyramid(image_path, output_dir, name=None, layout="dzi", ext=".jpg", tile_size=None, overlap=None,
+                   image=None, workers=None):
+    if layout not in LAYOUTS:
+        raise ValueError(f"unknown pyramid layout: {layout}")
+    if image is None:
+        image = Image.open(image_path)
+    name = name or os.path.splitext(os.path.basename(image_path))[0]
+    tile_size = tile_size or (DZI_TILE_SIZE if layout == "dzi" else XYZ_TILE_SIZE)
+    overlap = (DZI_OVERLAP if overlap is None else overlap) if layout == "dzi" else 0
+    if image.mode in ("P", "1"):
+        # reduce() only handles continuous-tone modes
+        image = image.convert("RGBA" if image.mode == "P" else "L")
+    image.load()
+    size = image.size
+
+    levels = level_count(size)
+    if layout == "dzi":
+        root = os.path.join(output_dir, name + "_files")
+        first_level = 0
+    else:
+        # zoom 0 is the first level that fits in a single tile
+        root = os.path.join(output_dir, name)
+        first_level = levels - 1 - int(math.ceil(math.log2(max(max(size) / tile_size, 1))))
+
+    tiles = 0
+    level_image = image
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        for level in range(levels - 1, first_level - 1, -1):
+            zoom = level - first_level
+            jobs = []
+            for col, row, box in tile_boxes(level_image.size, tile_size, overlap):
+                if layout == "dzi":
+                    folder, filename = os.path.join(root, str(level)), f"{col}_{row}{ext}"
+                else:
+                    folder, filename = os.path.join(root, str(zoom), str(col)), f"{row}{ext}"
+                os.makedirs(folder, exist_ok=True)
+                jobs.append(pool.submit(write_tile, level_image, box, os.path.join(folder, filename), ext,
+                                        tile_size if layout == "xyz" else None))
+            for job in jobs:
+                job.result()
+            tiles += len(jobs)
+            if level > first_level:
+                # each level is halved from the previous one rather than resampled from the source
+                level_image = level_image.reduce(2)
+
+    if layout == "dzi":
+        descriptor = dzi_descriptor(size, tile_size, overlap, ext).encode("utf-8")
+        atomic_write(os.path.join(output_dir, name + ".dzi"), lambda f: f.write(descriptor))
+    return tiles
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="tile_pyramid", description="Export a Deep Zoom / XYZ tile pyramid.")
+    parser.add_argument("image")
+    parser.add_argument("-o", "--output-dir", default="exports")
+    parser.add_argument("--name", help="base name of the pyramid (defaults to the image name)")
+    parser.add_argument("--layout", choices=LAYOUTS, default="dzi")
+    parser.add_argument("--ext", default=".jpg")
+    parser.add_argument("--tile-size", type=int, default=None)
+    parser.add_argument("--overlap", type=int, default=None, help="DZI tile overlap in pixels")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args(argv)
+    # pyramids are typically built from sources beyond Pillow's decompression bomb limit
+    Image.MAX_IMAGE_PIXELS = None
+
+    tiles = export_pyramid(args.image, args.output_dir, args.name, args.layout, args.ext, args.tile_size,
+                           args.overlap, workers=args.workers)
+    print(f"Exported {tiles} tiles to: {args.output_dir}")
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,31 @@
 import os
 import json
-import hashlib
-import random
-import zipfile
-from PIL import Image
+from contextlib import nullcontext
 from PyQt6.QtWidgets import (
     QMainWindow, QWidget, QLabel, QVBoxLayout, QHBoxLayout,
-    QPushButton, QLineEdit, QComboBox, QFileDialog, QMessageBox, QCheckBox
+    QPushButton, QLineEdit, QComboBox, QFileDialog, QMessageBox, QCheckBox, QSpinBox, QToolButton, QMenu,
+    QInputDialog
 )
+from PyQt6.QtGui import QShortcut, QKeySequence
 from PyQt6.QtCore import Qt
 from app.image_canvas import ImageCanvas
+from app.crop_strip import CropStrip
+from app.auto_guides import DEFAULT_TOLERANCE, detect_guides
+from app.image_source import read_preview
+from app.image_session import ImageSession
+from app.filmstrip import Filmstrip
+from app.export_crops import export_crops, grid_boxes, written_entries
+from app.tile_filter import TileFilter, blank_cells
+from app.export_sinks import DirectorySink, ZipSink
+from app.sprite_slicer import detect_sprites
+from app.export_journal import ExportJournal
+from app.export_catalog import ExportCatalog
+from app.tile_pyramid import export_pyramid
+from app.frame_export import export_frames, frame_count, frame_dir
+from app.export_estimate import DEFAULT_MEMORY_BUDGET, estimate_export
 
 SETTINGS_FILE = "settings.json"
+CATALOG_FILE = "export_catalog.sqlite"
 
 class MainWindow(QMainWindow):
     def __init__(self):
@@ -19,7 +33,13 @@ class MainWindow(QMainWindow):
         self.setWindowTitle("Image Resizer")
         self.setGeometry(200, 200, 1200, 800)
         self.loaded_image_path = None
+        self.image_source = None
         self.export_mode = False
+        self.memory_budget = DEFAULT_MEMORY_BUDGET
+        self.session = ImageSession(self)
+        self.session.source_ready.connect(self.on_source_loaded)
+        self.session.load_progress.connect(self.on_load_progress)
+        self.session.load_failed.connect(self.on_load_failed)
 
         central_widget = QWidget()
         self.setCentralWidget(central_widget)
@@ -51,21 +71,71 @@ class MainWindow(QMainWindow):
 
         self.grid_btn = QPushButton("🧮 Toggle Grid")
         self.grid_btn.clicked.connect(self.toggle_grid_preview)
+        self.auto_guides_btn = QPushButton("🪄 Auto-detect guides")
+        self.auto_guides_btn.clicked.connect(self.auto_detect_guides)
+        self.tolerance_input = QSpinBox()
+        self.tolerance_input.setRange(0, 128)
+        self.tolerance_input.setValue(DEFAULT_TOLERANCE)
+        self.tolerance_input.setToolTip("Gutter color tolerance")
+        self.snap_checkbox = QCheckBox("🧲 Snap to edges")
+        self.snap_checkbox.setToolTip("Snap new and dragged guides to strong edges in the image")
+        self.snap_checkbox.toggled.connect(self.toggle_snap_edges)
+        self.select_btn = QToolButton()
+        self.select_btn.setText("☑️ Select")
+        self.select_btn.setToolTip("Bulk-select preview cells; drag across the grid to set a block of cells")
+        self.select_btn.setPopupMode(QToolButton.ToolButtonPopupMode.InstantPopup)
+        select_menu = QMenu(self.select_btn)
+        select_menu.addAction("All cells", lambda: self.update_selection(lambda s: s.select_all()))
+        select_menu.addAction("No cells", lambda: self.update_selection(lambda s: s.select_none()))
+        select_menu.addAction("Invert", lambda: self.update_selection(lambda s: s.invert()))
+        select_menu.addAction("Every Nth column…", lambda: self.select_every("vertical"))
+        select_menu.addAction("Every Nth row…", lambda: self.select_every("horizontal"))
+        select_menu.addAction("Non-blank cells", self.select_non_blank)
+        self.select_btn.setMenu(select_menu)
+        self.regions_btn = QPushButton("▭ Draw Regions")
+        self.regions_btn.setCheckable(True)
+        self.regions_btn.setToolTip("Drag on the image to add a region, right-click a region to remove it")
+        self.regions_btn.toggled.connect(self.toggle_region_mode)
+        self.sprites_btn = QPushButton("🧩 Detect Sprites")
+        self.sprites_btn.clicked.connect(self.detect_sprite_regions)
         self.zip_checkbox = QCheckBox("📦 Export as ZIP only")
+        self.catalog_checkbox = QCheckBox("🗂️ Record in catalog")
+        self.skip_blank_checkbox = QCheckBox("🧽 Skip blank/duplicate tiles")
+        self.stats_checkbox = QCheckBox("📊 Tile stats")
+        self.stats_checkbox.setToolTip("Write mean colour, histogram, entropy and alpha coverage per tile to export_stats.csv")
+        self.all_frames_checkbox = QCheckBox("🎞️ All frames")
+        self.all_frames_checkbox.setToolTip("Slice every page/frame of multi-page TIFF, GIF and WebP files")
+        # the catalog keys tiles by source and rect, which every frame shares
+        self.all_frames_checkbox.toggled.connect(lambda checked: self.catalog_checkbox.setDisabled(checked))
         self.open_btn = QPushButton("🖼️ Open Image")
         self.open_btn.clicked.connect(self.open_image_dialog)
+        self.open_folder_btn = QPushButton("📂 Open Folder")
+        self.open_folder_btn.clicked.connect(self.open_folder_dialog)
+        QShortcut(QKeySequence(Qt.Key.Key_PageDown), self, self.show_next_image)
+        QShortcut(QKeySequence(Qt.Key.Key_PageUp), self, self.show_previous_image)
 
         for w in [QLabel("Type:"), self.file_type_dropdown, QLabel("Prefix:"), self.prefix_input,
                   QLabel("Resize Output:"), self.resize_mode_dropdown, self.resize_input,
                   QLabel("Suffix:"), self.suffix_input, self.output_btn, self.output_label,
-                  self.grid_btn, self.zip_checkbox, self.open_btn]:
+                  self.grid_btn, self.select_btn, self.auto_guides_btn, self.tolerance_input, self.snap_checkbox,
+                  self.regions_btn, self.sprites_btn, self.zip_checkbox, self.catalog_checkbox,
+                  self.skip_blank_checkbox, self.stats_checkbox, self.all_frames_checkbox, self.open_btn,
+                  self.open_folder_btn]:
             layout.addWidget(w)
 
         self.main_layout.addLayout(layout)
 
     def init_canvas(self):
-        self.canvas = ImageCanvas(on_image_loaded=self.on_image_loaded, on_guides_updated=self.on_guides_changed)
-        self.main_layout.addWidget(self.canvas, stretch=1)
+        layout = QHBoxLayout()
+        self.crop_strip = CropStrip()
+        self.canvas = ImageCanvas(on_image_loaded=self.on_image_loaded, on_guides_updated=self.on_guides_changed,
+                                  on_preview_changed=self.refresh_crop_strip)
+        layout.addWidget(self.canvas, stretch=1)
+        layout.addWidget(self.crop_strip)
+        self.main_layout.addLayout(layout, stretch=1)
+        self.filmstrip = Filmstrip()
+        self.filmstrip.clicked.connect(self.on_filmstrip_clicked)
+        self.main_layout.addWidget(self.filmstrip)
 
     def init_footer(self):
         layout = QHBoxLayout()
@@ -74,7 +144,10 @@ class MainWindow(QMainWindow):
         self.clear_btn.clicked.connect(self.on_clear_clicked)
         self.export_btn = QPushButton("🔍 Preview")
         self.export_btn.clicked.connect(self.on_export_clicked)
-        for w in [self.status, self.clear_btn, self.export_btn]:
+        self.pyramid_btn = QPushButton("🗺️ Export Tile Pyramid")
+        self.pyramid_btn.setToolTip("Write a Deep Zoom (.dzi) tile pyramid of the whole image")
+        self.pyramid_btn.clicked.connect(self.export_tile_pyramid)
+        for w in [self.status, self.clear_btn, self.pyramid_btn, self.export_btn]:
             layout.addWidget(w)
         self.main_layout.addLayout(layout)
 
@@ -84,21 +157,156 @@ class MainWindow(QMainWindow):
             self.output_label.setText(folder)
 
     def open_image_dialog(self):
-        file_path, _ = QFileDialog.getOpenFileName(self, "Open Image", "", "Images (*.png *.jpg *.jpeg)")
-        if file_path:
-            self.canvas.load_image(file_path)
-            self.loaded_image_path = file_path
-            self.reset_export_mode()
+        file_paths, _ = QFileDialog.getOpenFileNames(self, "Open Images", "", "Images (*.png *.jpg *.jpeg *.tif *.tiff *.gif *.webp)")
+        if file_paths:
+            self.open_session(file_paths)
+
+    def open_folder_dialog(self):
+        folder = QFileDialog.getExistingDirectory(self, "Open Folder")
+        if not folder:
+            return
+        paths = sorted(os.path.join(folder, name) for name in os.listdir(folder) if self.canvas.is_valid_image(name))
+        if not paths:
+            self.status.setText("⚠️ No images found in that folder.")
+            return
+        self.open_session(paths)
+
+    def load_image(self, file_path):
+        self.open_session([file_path])
+
+    def open_session(self, paths):
+        self.session.set_paths(paths)
+        self.filmstrip.set_paths(paths)
+        self.show_image(0)
+
+    def show_image(self, index):
+        if not 0 <= index < len(self.session.paths):
+            return
+        current = self.session.current_path()
+        if current and current == self.loaded_image_path:
+            self.session.save_state(current, self.canvas.get_state())
+
+        file_path = self.session.select(index)
+        source = self.session.source(file_path)
+        if source:
+            self.canvas.load_image(source)
+        else:
+            try:
+                size, preview = read_preview(file_path)
+            except Exception as e:
+                self.status.setText(f"⚠️ Could not open image: {e}")
+                return
+            self.canvas.begin_loading(file_path, size, preview)
+        self.image_source = source
+        self.loaded_image_path = file_path
+        state = self.session.state(file_path)
+        if state:
+            self.canvas.set_state(state)
+        self.filmstrip.select_row(index)
+        self.reset_export_mode()
+        if source:
+            self.status.setText("🖼️ Image loaded. ➕ Add vertical and horizontal lines to begin, then click Preview.")
+        else:
+            self.status.setText("⏳ Loading image... ➕ You can start adding lines now.")
+
+    def show_next_image(self):
+        self.show_image(self.session.index + 1)
+
+    def show_previous_image(self):
+        self.show_image(self.session.index - 1)
+
+    def on_filmstrip_clicked(self, index):
+        if index.row() != self.session.index:
+            self.show_image(index.row())
+
+    def on_load_progress(self, path, percent):
+        if path == self.loaded_image_path and not self.image_source:
+            self.status.setText(f"⏳ Loading image... {percent}% ➕ You can start adding lines now.")
+
+    def on_source_loaded(self, source):
+        if source.path != self.loaded_image_path or self.image_source:
+            return
+        self.image_source = source
+        self.canvas.finish_loading(source)
+        if not self.export_mode:
             self.status.setText("🖼️ Image loaded. ➕ Add vertical and horizontal lines to begin, then click Preview.")
 
+    def on_load_failed(self, path, message):
+        if path != self.loaded_image_path:
+            return
+        self.canvas.clear_canvas()
+        self.reset_export_mode()
+        self.status.setText(f"⚠️ Could not load image: {message}")
+
     def on_image_loaded(self, path):
         self.loaded_image_path = path
 
+    def auto_detect_guides(self):
+        if not self.image_source:
+            self.status.setText("⏳ Image is still loading. Try again in a moment.")
+            return
+        scaled_pixmap = self.canvas.pixmap()
+        vertical, horizontal = detect_guides(self.image_source.image, self.tolerance_input.value())
+        w, h = self.image_source.size
+        x_ratio = scaled_pixmap.width() / w
+        y_ratio = scaled_pixmap.height() / h
+        self.canvas.set_guides([int(x * x_ratio) for x in vertical], [int(y * y_ratio) for y in horizontal])
+        if vertical or horizontal:
+            self.status.setText(f"🪄 Detected {len(vertical)} vertical and {len(horizontal)} horizontal gutter(s).")
+        else:
+            self.status.setText("🪄 No uniform gutters found. Try a higher tolerance.")
+
+    def toggle_region_mode(self, enabled):
+        self.canvas.toggle_region_mode(enabled)
+
+    def update_selection(self, change):
+        change(self.canvas.cell_selection())
+        self.canvas.selection_changed()
+
+    def select_every(self, axis):
+        label = "columns" if axis == "vertical" else "rows"
+        step, ok = QInputDialog.getInt(self, "Select Every Nth", f"Keep every Nth of the {label}:", 2, 1, 100)
+        if ok:
+            self.update_selection(lambda s: s.select_every(axis, step))
+
+    def select_non_blank(self):
+        if not self.image_source:
+            self.status.setText("⏳ Image is still loading. Try again in a moment.")
+            return
+        x_lines, y_lines = self.image_grid_lines()
+        blank = blank_cells(self.image_source.image, x_lines, y_lines)
+        self.update_selection(lambda s: s.select_where(~blank))
+        self.status.setText(f"☑️ Selected {int((~blank).sum())} non-blank of {blank.size} cells.")
+
+    def image_grid_lines(self):
+        # guides are kept in display pixels; grid lines in image pixels
+        w, h = self.image_source.size
+        scaled_pixmap = self.canvas.pixmap()
+        x_ratio = w / scaled_pixmap.width()
+        y_ratio = h / scaled_pixmap.height()
+        x_lines = [0] + sorted(int(x * x_ratio) for x in self.canvas.get_vertical_guides()) + [w]
+        y_lines = [0] + sorted(int(y * y_ratio) for y in self.canvas.get_horizontal_guides()) + [h]
+        return x_lines, y_lines
+
+    def toggle_snap_edges(self, enabled):
+        self.canvas.set_snap_edges(enabled)
+
+    def detect_sprite_regions(self):
+        if not self.image_source:
+            self.status.setText("⏳ Image is still loading. Try again in a moment.")
+            return
+        boxes = detect_sprites(self.image_source.image)
+        self.canvas.add_regions(boxes)
+        self.status.setText(f"🧩 Added {len(boxes)} sprite region(s).")
+
     def toggle_grid_preview(self):
         self.canvas.toggle_grid(not self.canvas.show_grid)
 
     def on_clear_clicked(self):
         self.canvas.clear_canvas()
+        self.image_source = None
+        self.session.set_paths([])
+        self.filmstrip.set_paths([])
         self.reset_export_mode()
         self.status.setText("🧹 Canvas cleared.")
 
@@ -106,6 +314,24 @@ class MainWindow(QMainWindow):
         self.export_mode = False
         self.canvas.toggle_grid(False)
         self.export_btn.setText("🔍 Preview")
+        self.refresh_crop_strip()
+
+    def refresh_crop_strip(self):
+        if not self.export_mode or not self.canvas.scaled_image:
+            self.crop_strip.clear()
+            return
+        includes = self.canvas.get_active_crop_flags()
+        cells, labels = [], []
+        grid_cells = self.canvas.preview_cells()
+        regions = self.canvas.preview_regions()
+        if regions and not self.canvas.get_vertical_guides() and not self.canvas.get_horizontal_guides():
+            grid_cells = []
+        for idx, rect in enumerate(grid_cells + regions):
+            if idx < len(includes) and idx < len(grid_cells) and not includes[idx]:
+                continue
+            cells.append(rect)
+            labels.append(f"#{len(cells)}")
+        self.crop_strip.show_cells(self.canvas.scaled_image, cells, labels)
 
     def on_export_clicked(self):
         if not self.loaded_image_path:
@@ -120,19 +346,21 @@ class MainWindow(QMainWindow):
             includes = self.canvas.get_active_crop_flags()
             total_sections = (len(vertical) + 1) * (len(horizontal) + 1)
 
-            if total_sections == 1:
+            if total_sections == 1 and not self.canvas.get_regions():
                 self.status.setText("⚠️ No crop lines added. The entire image will be exported as one section.")
             else:
                 self.status.setText("👀 Preview enabled. Click Export to proceed.")
 
             self.export_mode = True
             self.export_btn.setText("📤 Export")
+            self.refresh_crop_strip()
         else:
             self.export_images()
 
     def on_guides_changed(self):
         if not self.export_mode:
             return
+        self.refresh_crop_strip()
         vertical = self.canvas.get_vertical_guides()
         horizontal = self.canvas.get_horizontal_guides()
         if len(vertical) == 0 and len(horizontal) == 0:
@@ -143,117 +371,148 @@ class MainWindow(QMainWindow):
     
     
     def export_images(self):
+        if not self.image_source:
+            self.status.setText("⏳ Image is still loading. Try again in a moment.")
+            return
         vertical = self.canvas.get_vertical_guides()
         horizontal = self.canvas.get_horizontal_guides()
 
-        image = Image.open(self.loaded_image_path)
-        if image.mode == "RGBA" and self.file_type_dropdown.currentText() == "JPEG":
-            image = image.convert("RGB")
-        w, h = image.size
         scaled_pixmap = self.canvas.pixmap()
         if not scaled_pixmap or scaled_pixmap.width() == 0 or scaled_pixmap.height() == 0:
             self.status.setText("⚠️ Image not rendered.")
             return
 
-        x_ratio = w / scaled_pixmap.width()
-        y_ratio = h / scaled_pixmap.height()
-        x_lines = [0] + sorted(int(x * x_ratio) for x in vertical) + [w]
-        y_lines = [0] + sorted(int(y * y_ratio) for y in horizontal) + [h]
-
-        includes = self.canvas.get_active_crop_flags()
-        total_sections = (len(x_lines) - 1) * (len(y_lines) - 1)
-        if len(includes) < total_sections:
-            includes += [True] * (total_sections - len(includes))
-
-        num_exporting = sum(1 for flag in includes[:total_sections] if flag)
+        x_lines, y_lines = self.image_grid_lines()
+        boxes = list(grid_boxes(x_lines, y_lines))
+        includes = list(self.canvas.get_active_crop_flags()[:len(boxes)])
+        includes += [True] * (len(boxes) - len(includes))
+        regions = self.canvas.get_regions()
+        if regions and not vertical and not horizontal:
+            # drawn regions replace the implicit whole-image section
+            boxes, includes = [], []
+        boxes += regions
+        includes += [True] * len(regions)
+
+        num_exporting = sum(1 for flag in includes if flag)
         if num_exporting == 0:
             self.status.setText("🚫 No crop sections selected.")
             return
 
-        confirm = QMessageBox.question(
-            self, "Confirm Export",
-            f"📤 You are about to export {num_exporting} cropped image(s). Continue?",
-            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.Cancel
-        )
-        if confirm != QMessageBox.StandardButton.Yes:
-            self.status.setText("❌ Export cancelled by user.")
-            return
-
         out_dir = self.output_label.text()
         if not out_dir or out_dir == "No folder selected":
             base = os.path.splitext(os.path.basename(self.loaded_image_path))[0]
             out_dir = os.path.join(os.path.dirname(self.loaded_image_path), base)
-        os.makedirs(out_dir, exist_ok=True)
 
         prefix = self.prefix_input.text() or "cropped"
         suffix = self.suffix_input.text() or ""
         ext = ".jpg" if self.file_type_dropdown.currentText() == "JPEG" else ".png"
         export_as_zip = self.zip_checkbox.isChecked()
 
-        def fname(i):
-            h = hashlib.sha256(str(random.random()).encode()).hexdigest()[:8]
-            return f"{prefix}-{i}-{h}{suffix}{ext}"
-
-        log = open(os.path.join(out_dir, "export_log.txt"), "w")
-        log.write("filename,x1,y1,x2,y2\n")
-
-        images = []
-        idx = 1
-        grid_idx = 0
-
-        for i in range(len(x_lines) - 1):
-            for j in range(len(y_lines) - 1):
-                if grid_idx >= len(includes) or not includes[grid_idx]:
-                    grid_idx += 1
-                    continue
-                x1, x2 = x_lines[i], x_lines[i + 1]
-                y1, y2 = y_lines[j], y_lines[j + 1]
-                crop = image.crop((x1, y1, x2, y2))
-                # Resize if requested
-                resize_mode = self.resize_mode_dropdown.currentText()
-                try:
-                    percent = float(self.resize_input.text())
-                except (ValueError, TypeError):
-                    percent = None
-
-                if percent and percent > 0 and resize_mode != "No Resize":
-                    w0, h0 = crop.size
-                    if resize_mode == "Resize by Width":
-                        w1 = int(w0 * percent / 100)
-                        h1 = int(h0 * percent / 100)
-                    elif resize_mode == "Resize by Height":
-                        h1 = int(h0 * percent / 100)
-                        w1 = int(w0 * percent / 100)
-                    crop = crop.resize((w1, h1), Image.Resampling.LANCZOS)
-
-                name = fname(idx)
-                if export_as_zip:
-                    temp_path = os.path.join(out_dir, name)
-                    crop.save(temp_path)
-                    images.append((temp_path, name))
-                else:
-                    crop.save(os.path.join(out_dir, name))
-                log.write(f"{name},{x1},{y1},{x2},{y2}\n")
-                idx += 1
-                grid_idx += 1
-        log.close()
-
-        if export_as_zip:
-            zip_path = os.path.join(out_dir, os.path.basename(out_dir) + ".zip")
-            with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                for file_path, arcname in images:
-                    zipf.write(file_path, arcname=arcname)
-                    os.remove(file_path)
+        percent = None
+        if self.resize_mode_dropdown.currentText() != "No Resize":
+            try:
+                percent = float(self.resize_input.text())
+            except (ValueError, TypeError):
+                percent = None
+
+        frames = frame_count(self.loaded_image_path) if self.all_frames_checkbox.isChecked() else 1
+        estimate = estimate_export(self.image_source.image, boxes, includes, out_dir, ext, percent,
+                                   zip_output=export_as_zip, memory_budget=self.memory_budget).repeated(frames)
+        details = "\n".join(estimate.summary())
+        warnings = "".join(f"\n⚠️ {warning}" for warning in estimate.warnings())
+        across = f" across {frames} frames" if frames > 1 else ""
+        confirm = QMessageBox.question(
+            self, "Confirm Export",
+            f"📤 You are about to export {num_exporting * frames} cropped image(s){across}. Continue?\n\n"
+            f"{details}{warnings}",
+            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.Cancel
+        )
+        if confirm != QMessageBox.StandardButton.Yes:
+            self.status.setText("❌ Export cancelled by user.")
+            return
+        os.makedirs(out_dir, exist_ok=True)
+
+        # multi-frame exports journal each frame in its own folder
+        journal_dirs = [frame_dir(out_dir, frame) for frame in range(frames)] if frames > 1 else [out_dir]
+        stats = "csv" if self.stats_checkbox.isChecked() else None
+
+        resume = False
+        if not export_as_zip and any(ExportJournal.incomplete(folder) for folder in journal_dirs):
+            answer = QMessageBox.question(
+                self, "Resume Export",
+                "♻️ A previous export into this folder was interrupted. Resume it?",
+                QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
+            )
+            resume = answer == QMessageBox.StandardButton.Yes
+
+        zip_path = os.path.join(out_dir, os.path.basename(out_dir) + ".zip")
+        if frames > 1:
+            # every frame gets its own folder under the output directory, or inside the ZIP
+            sink = ZipSink(zip_path) if export_as_zip else None
+            with sink or nullcontext():
+                count = export_frames(self.loaded_image_path, x_lines[1:-1], y_lines[1:-1], out_dir, prefix, suffix,
+                                      ext, includes=includes, resize_percent=percent, boxes=boxes, resume=resume,
+                                      skip_blank=self.skip_blank_checkbox.isChecked(), stats=stats, sink=sink)
+            self.status.setStyleSheet("color: green;")
+            self.status.setText(f"✅ Exported {count} images from {frames} frames. "
+                                + ("ZIP created." if export_as_zip else "Saved in folder."))
+            self.save_settings()
+            return
+
+        # tiles that only end up inside the ZIP are not catalogued
+        catalog = None
+        if self.catalog_checkbox.isChecked() and not export_as_zip:
+            catalog = ExportCatalog(CATALOG_FILE)
+        # ZIP exports stream straight into the archive instead of going through loose files
+        sink = ZipSink(zip_path) if export_as_zip else DirectorySink(out_dir)
+        try:
+            with sink:
+                entries = export_crops(
+                    self.loaded_image_path, x_lines[1:-1], y_lines[1:-1], out_dir, prefix, suffix, ext,
+                    includes=includes, resize_percent=percent, resume=resume,
+                    image=self.image_source.image, catalog=catalog, boxes=boxes,
+                    tile_filter=TileFilter() if self.skip_blank_checkbox.isChecked() else None, sink=sink,
+                    stats=stats
+                )
+        finally:
+            if catalog:
+                catalog.close()
+
+        written = written_entries(entries)
 
         self.status.setStyleSheet("color: green;")
-        self.status.setText(f"✅ Exported {idx - 1} images. " + ("ZIP created." if export_as_zip else "Saved in folder."))
+        skipped = f" Skipped {len(entries) - len(written)} blank/duplicate tiles." if len(written) < len(entries) else ""
+        self.status.setText(f"✅ Exported {len(written)} images. " + ("ZIP created." if export_as_zip else "Saved in folder.")
+                            + skipped)
+        self.save_settings()
+
+    def export_tile_pyramid(self):
+        if not self.image_source:
+            self.status.setText("⏳ Image is still loading. Try again in a moment.")
+            return
+        start = self.output_label.text()
+        if not start or start == "No folder selected":
+            start = os.path.dirname(self.loaded_image_path)
+        out_dir = QFileDialog.getExistingDirectory(self, "Select Pyramid Output Folder", start)
+        if not out_dir:
+            self.status.setText("❌ Pyramid export cancelled.")
+            return
+        ext = ".jpg" if self.file_type_dropdown.currentText() == "JPEG" else ".png"
+        tiles = export_pyramid(self.loaded_image_path, out_dir, ext=ext, image=self.image_source.image)
+        self.status.setStyleSheet("color: green;")
+        self.status.setText(f"✅ Exported {tiles} pyramid tiles to {out_dir}.")
         self.save_settings()
 
     def save_settings(self):
         data = {
             "file_type": self.file_type_dropdown.currentText(),
             "output_folder": self.output_label.text(),
-            "zip_enabled": self.zip_checkbox.isChecked()
+            "zip_enabled": self.zip_checkbox.isChecked(),
+            "catalog_enabled": self.catalog_checkbox.isChecked(),
+            "skip_blank_enabled": self.skip_blank_checkbox.isChecked(),
+            "snap_enabled": self.snap_checkbox.isChecked(),
+            "stats_enabled": self.stats_checkbox.isChecked(),
+            "memory_budget_mb": self.memory_budget // (1024 * 1024)
         }
         with open(SETTINGS_FILE, "w") as f:
             json.dump(data, f)
@@ -264,4 +523,9 @@ class MainWindow(QMainWindow):
                 data = json.load(f)
                 self.file_type_dropdown.setCurrentText(data.get("file_type", "JPEG"))
                 self.output_label.setText(data.get("output_folder", "No folder selected"))
-                self.zip_checkbox.setChecked(data.get("zip_enabled", False))
\ No newline at end of file
+                self.zip_checkbox.setChecked(data.get("zip_enabled", False))
+                self.catalog_checkbox.setChecked(data.get("catalog_enabled", False))
+                self.skip_blank_checkbox.setChecked(data.get("skip_blank_enabled", False))
+                self.snap_checkbox.setChecked(data.get("snap_enabled", False))
+                self.stats_checkbox.setChecked(data.get("stats_enabled", False))
+                self.memory_budget = int(data.get("memory_budget_mb", self.memory_budget // (1024 * 1024))) * 1024 * 1024
\ No newline at end of file
@@ -1,4 +1,5 @@
 import sys
+import multiprocessing
 from PyQt6.QtWidgets import QApplication
 from app.ui_main_window import MainWindow
 
@@ -9,4 +10,6 @@ def main():
     sys.exit(app.exec())
 
 if __name__ == "__main__":
+    # frame export runs a process pool; frozen workers must not start another GUI
+    multiprocessing.freeze_support()
     main()